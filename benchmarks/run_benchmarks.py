@@ -0,0 +1,340 @@
+"""
+Benchmarks of the simulation and analysis hot paths.
+
+Every benchmark is timed as the best and the median of several repeats (each repeat
+calling it enough times to last about min_time seconds), with fixed seeds and
+energies, and the results are written as JSON. Compared against a saved baseline,
+the benchmarks whose best time grew by more than the threshold are reported as
+regressions (and the script exits with status 1).
+
+    python benchmarks/run_benchmarks.py                   # run all, save results
+    python benchmarks/run_benchmarks.py --save-baseline   # ... and make them the baseline
+    python benchmarks/run_benchmarks.py boxes             # only names containing "boxes"
+"""
+
+import argparse
+import datetime
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+
+import matplotlib
+
+matplotlib.use("Agg")
+
+import numpy as np
+import scipy
+
+script_dir = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(script_dir, "..", "src"))
+
+from animations import (
+    compute_observables,
+    find_initial_conditions,
+    integrate_trajectory,
+    interpolate_observables,
+    lagrange_equations,
+    poincare_section,
+)
+from dynamics import rest_initial_conditions, trajectory_crossings
+from ensemble import integrate_ensemble
+from trajectory import Trajectory
+from fractal import (
+    calculate_occupied_boxes,
+    calculate_occupied_boxes_multiscale,
+    correlation_dimension,
+    information_dimension,
+    init_frame_worker,
+    render_box_frame,
+)
+
+results_folder = os.path.join(script_dir, "results")
+baseline_path = os.path.join(script_dir, "baseline.json")
+
+SEED = 0
+DELTA_E = 12
+
+# name -> setup function returning (function to time, number of items it processes)
+BENCHMARKS = {}
+
+
+def benchmark(name):
+    def register(setup):
+        BENCHMARKS[name] = setup
+        return setup
+
+    return register
+
+
+def random_points(n):
+    # (7, n) observables with uniform angles and momenta, like a chaotic section
+    rng = np.random.default_rng(SEED)
+    return rng.uniform(-1, 1, size=(7, n))
+
+
+@benchmark("lagrange_equations")
+def setup_lagrange_equations():
+    y = find_initial_conditions(DELTA_E)
+    return lambda: lagrange_equations(0.0, y), 1
+
+
+@benchmark("lagrange_equations_vectorized_1e4")
+def setup_lagrange_equations_vectorized():
+    y = np.random.default_rng(SEED).uniform(-np.pi, np.pi, size=(4, 10**4))
+    return lambda: lagrange_equations(0.0, y), 10**4
+
+
+@benchmark("solve_ivp_trajectory")
+def setup_solve_ivp_trajectory():
+    y0 = find_initial_conditions(DELTA_E)
+    t_eval = np.linspace(0, 10, 1000)
+    return lambda: integrate_trajectory(y0, (0, 10), t_eval), len(t_eval)
+
+
+@benchmark("poincare_points")
+def setup_poincare_points():
+    y0 = find_initial_conditions(DELTA_E)
+    Np = 200
+    return lambda: poincare_section(y0, Np, 1, progress=False), Np
+
+
+@benchmark("compute_observables_1e5")
+def setup_compute_observables():
+    y = np.random.default_rng(SEED).uniform(-np.pi, np.pi, size=(4, 10**5))
+    return lambda: compute_observables(y), 10**5
+
+
+@benchmark("interpolate_observables")
+def setup_interpolate_observables():
+    y_old = find_initial_conditions(DELTA_E)
+    y_new = y_old + np.array([0.0, 0.0, 0.01, 0.01])
+    observable_old = compute_observables(y_old)
+    observable_new = compute_observables(y_new)
+    observable_new[1] = -observable_old[1] - 0.01  # crosses the section q2 = 0
+    return lambda: interpolate_observables(observable_old, observable_new, 1), 1
+
+
+@benchmark("trajectory_crossings")
+def setup_trajectory_crossings():
+    trajectory = Trajectory(find_initial_conditions(DELTA_E), (0, 1000))
+    t, Observables = trajectory.t, compute_observables(trajectory.y)
+    n_crossings = len(trajectory_crossings(t, Observables, 1)[0])
+    return lambda: trajectory_crossings(t, Observables, 1), n_crossings
+
+
+@benchmark("trajectory_states")
+def setup_trajectory_states():
+    # the lazy evaluation of a solve must give the states of t_eval
+    y0 = find_initial_conditions(DELTA_E)
+    trajectory = Trajectory(y0, (0, 50))
+    t = np.linspace(0, 50, 10**4)
+    error = np.abs(trajectory.states(t) - integrate_trajectory(y0, (0, 50), t)[1])
+    if error.max() > 1e-12:
+        raise AssertionError(f"Trajectory.states differs from t_eval by {error.max()}")
+    return lambda: trajectory.states(t), len(t)
+
+
+@benchmark("trajectory_crossings_rotating")
+def setup_trajectory_crossings_rotating():
+    # an orbit whose lower arm rotates: the one-sided sections must split the
+    # crossings by the sign of omega2, through every multiple of 2 pi
+    trajectory = Trajectory(find_initial_conditions(40), (0, 300))
+    t, Observables = trajectory.t, compute_observables(trajectory.y)
+    for direction in (1, -1):
+        points = trajectory_crossings(t, Observables, 1, direction)[1]
+        if np.any(np.sign(points[3]) != direction):
+            raise AssertionError(
+                f"direction={direction} kept crossings with the other sign of omega2"
+            )
+    n_crossings = len(trajectory_crossings(t, Observables, 1)[0])
+    return lambda: trajectory_crossings(t, Observables, 1, 1), n_crossings
+
+
+for dtype in ("float64", "float32"):
+
+    @benchmark(f"integrate_ensemble_{dtype}_1e3")
+    def setup_integrate_ensemble(dtype=dtype):
+        y0 = rest_initial_conditions(DELTA_E, 10**3)
+        return (
+            lambda: integrate_ensemble(
+                lagrange_equations, (0, 5), y0, rtol=1e-8, atol=1e-8, dtype=dtype
+            ),
+            10**3,
+        )
+
+
+for n in (10**4, 10**5, 10**6):
+
+    @benchmark(f"occupied_boxes_1e{int(np.log10(n))}")
+    def setup_occupied_boxes(n=n):
+        points = random_points(n)
+        return lambda: calculate_occupied_boxes(points, 0, 4, r=0.01), n
+
+    @benchmark(f"occupied_boxes_multiscale_1e{int(np.log10(n))}")
+    def setup_occupied_boxes_multiscale(n=n):
+        points = random_points(n)
+        bbox = (-1, 1, -1, 1)
+        return (
+            lambda: calculate_occupied_boxes_multiscale(points, 0, 4, bbox, 7),
+            n,
+        )
+
+
+@benchmark("correlation_dimension_1e5")
+def setup_correlation_dimension():
+    points = random_points(10**5)
+    return lambda: correlation_dimension(points, 0, 4), 10**5
+
+
+@benchmark("information_dimension_1e5")
+def setup_information_dimension():
+    points = random_points(10**5)
+    return lambda: information_dimension(points, 0, 4), 10**5
+
+
+@benchmark("fractal_frame_rendering")
+def setup_fractal_frame_rendering():
+    points = random_points(10**5)
+    bbox = (-1, 1, -1, 1)
+    box_sizes, occupied = calculate_occupied_boxes_multiscale(points, 0, 4, bbox, 7)
+    init_frame_worker(points[0], points[4])
+    folder = tempfile.mkdtemp()
+    frame = len(box_sizes) - 1
+    return (
+        lambda: render_box_frame(
+            frame, box_sizes[frame], occupied[frame], bbox, folder
+        ),
+        1,
+    )
+
+
+def time_benchmark(function, repeat=5, min_time=0.2):
+    # (best, median) time of one call, in seconds
+    start = time.perf_counter()
+    function()
+    elapsed = time.perf_counter() - start
+    number = max(1, int(min_time / max(elapsed, 1e-9)))
+
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for _ in range(number):
+            function()
+        times.append((time.perf_counter() - start) / number)
+    return min(times), float(np.median(times))
+
+
+def environment():
+    try:
+        commit = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            cwd=script_dir,
+            capture_output=True,
+            text=True,
+        ).stdout.strip()
+    except OSError:
+        commit = ""
+    return {
+        "date": datetime.datetime.now().isoformat(timespec="seconds"),
+        "commit": commit,
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "scipy": scipy.__version__,
+        "machine": platform.machine(),
+        "processor": platform.processor(),
+        "cpu_count": os.cpu_count(),
+    }
+
+
+def run_benchmarks(names, repeat=5, min_time=0.2):
+    results = {}
+    for name in names:
+        function, n_items = BENCHMARKS[name]()
+        best, median = time_benchmark(function, repeat=repeat, min_time=min_time)
+        results[name] = {
+            "best": best,
+            "median": median,
+            "items": n_items,
+            "items_per_second": n_items / best,
+        }
+        print(f"{name:40s} {best * 1e3:12.4f} ms {n_items / best:14.4g} items/s")
+    return results
+
+
+def compare(results, baseline, threshold=1.2):
+    # names of the benchmarks slower than threshold times their baseline
+    regressions = []
+    print(f"\n{'benchmark':40s} {'baseline':>12s} {'now':>12s} {'ratio':>8s}")
+    for name, result in results.items():
+        if name not in baseline:
+            continue
+        ratio = result["best"] / baseline[name]["best"]
+        flag = ""
+        if ratio > threshold:
+            regressions.append(name)
+            flag = "  REGRESSION"
+        elif ratio < 1 / threshold:
+            flag = "  faster"
+        print(
+            f"{name:40s} {baseline[name]['best'] * 1e3:10.4f}ms "
+            f"{result['best'] * 1e3:10.4f}ms {ratio:8.2f}{flag}"
+        )
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("filter", nargs="*", help="run the benchmarks containing these")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--min-time", type=float, default=0.2)
+    parser.add_argument("--baseline", default=baseline_path)
+    parser.add_argument("--save-baseline", action="store_true")
+    parser.add_argument(
+        "--threshold",
+        type=float,
+        default=1.2,
+        help="slowdown ratio reported as a regression",
+    )
+    args = parser.parse_args()
+
+    names = [
+        name
+        for name in BENCHMARKS
+        if not args.filter or any(pattern in name for pattern in args.filter)
+    ]
+    results = run_benchmarks(names, repeat=args.repeat, min_time=args.min_time)
+
+    report = {"environment": environment(), "results": results}
+    os.makedirs(results_folder, exist_ok=True)
+    stamp = datetime.datetime.now().strftime("%Y%m%d-%H%M%S")
+    results_path = os.path.join(results_folder, f"benchmarks_{stamp}.json")
+    with open(results_path, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"\nResults saved to: {results_path}")
+
+    regressions = []
+    if os.path.exists(args.baseline):
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        regressions = compare(results, baseline["results"], args.threshold)
+
+    if args.save_baseline:
+        # keep the baseline results of the benchmarks not run now
+        if os.path.exists(args.baseline):
+            baseline["results"].update(results)
+            report["results"] = baseline["results"]
+        with open(args.baseline, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"Baseline saved to: {args.baseline}")
+
+    if regressions:
+        print(f"\n{len(regressions)} regression(s): {', '.join(regressions)}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
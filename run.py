@@ -23,43 +23,141 @@ sys.path.insert(0, src_path)
 os.chdir(src_path)
 
 
-# Import and run the main application
-from animations import pendulum_animation, trajectory_animation, poincare_animation
+# The application modules are imported by the modes that use them, so that the
+# headless subcommands (simulate, poincare, fractal, render) start fast
+from cli import COMMANDS, main
+
+if __name__ == "__main__" and len(sys.argv) > 1 and sys.argv[1] in COMMANDS:
+    # headless batch commands: write arrays into data/ without clearing it
+    main(sys.argv[1:])
+elif __name__ == "__main__":
+    from cache import TrajectoryCache
+    from profiling import RunProfile
 
-if __name__ == "__main__":
     folder_name = data_folder_path
+    cache_folder = os.path.join(folder_name, "cache")
+    sections_folder = os.path.join(folder_name, "sections")
     mode_arg = "animate"
     type_arg = "pendulum"
 
+    # --keep-cache keeps the trajectory cache (data/cache) and the streamed
+    # Poincare sections (data/sections) across runs
+    keep_cache = "--keep-cache" in sys.argv
+    if keep_cache:
+        sys.argv.remove("--keep-cache")
+
+    # --float32 integrates the chaos and flip-time maps in single precision
+    dtype = "float32" if "--float32" in sys.argv else "float64"
+    if dtype == "float32":
+        sys.argv.remove("--float32")
+
     # --- Start of new logic to clear folder if it exists ---
     if os.path.exists(folder_name):  # Check if the folder exists
         print(f"Folder '{folder_name}' already exists. Clearing its contents...")
-        # Remove the folder and its contents
-        shutil.rmtree(folder_name)
-        # Recreate the empty folder
-        os.makedirs(folder_name)
-        print(f"Folder '{folder_name}' cleared and recreated.")
+        # Remove the contents of the folder (except the cache, if kept)
+        for entry in os.listdir(folder_name):
+            path = os.path.join(folder_name, entry)
+            if keep_cache and path in (cache_folder, sections_folder):
+                continue
+            if os.path.isdir(path):
+                shutil.rmtree(path)
+            else:
+                os.remove(path)
+        print(f"Folder '{folder_name}' cleared.")
     else:
         # Create the folder if it does not exist
         os.makedirs(folder_name)  #
         print(f"Folder '{folder_name}' created successfully.")
     # --- End of new logic ---
 
+    cache = TrajectoryCache(cache_folder)
+
     if len(sys.argv) > 1:
         mode_arg = sys.argv[1]
         if len(sys.argv) > 2:
             type_arg = sys.argv[2]
 
+    # timings, solver statistics and energy drift of the run, saved into data/
+    profile = RunProfile(mode_arg + "_" + type_arg)
+
+    if mode_arg in ("animate", "export"):
+        from animations import (
+            pendulum_animation,
+            trajectory_animation,
+            poincare_animation,
+        )
+
     if mode_arg == "animate":
         if type_arg == "pendulum":
-            pendulum_animation()
+            pendulum_animation(cache=cache, profile=profile)
         elif type_arg == "trajectory":
-            trajectory_animation()
+            trajectory_animation(cache=cache, profile=profile)
         elif type_arg == "Poincare":
-            poincare_animation(folder_name=folder_name)
+            poincare_animation(folder_name=folder_name, cache=cache, profile=profile)
         else:
             print(f"Invalid type: {type_arg}")
             sys.exit(1)
+    elif mode_arg == "export":
+        # headless video of an animation, e.g. python run.py export pendulum
+        video = os.path.join(folder_name, type_arg + "_animation.mp4")
+        if type_arg == "pendulum":
+            pendulum_animation(cache=cache, profile=profile, video=video)
+        elif type_arg == "trajectory":
+            trajectory_animation(cache=cache, profile=profile, video=video)
+        elif type_arg == "Poincare":
+            poincare_animation(
+                folder_name=folder_name, cache=cache, profile=profile, video=video
+            )
+        else:
+            print(f"Invalid type: {type_arg}")
+            sys.exit(1)
+    elif mode_arg == "atlas":
+        # energies DeltaE of the atlas, e.g. python run.py atlas 5 10 15 20
+        from atlas import poincare_atlas
+
+        energies = [float(E) for E in sys.argv[2:]] or [2, 5, 8, 12, 15, 20, 25, 30, 40]
+        poincare_atlas(energies, folder_name=folder_name)
+    elif mode_arg == "chaos":
+        # grid resolution of the chaos map, e.g. python run.py chaos 256
+        from lyapunov import chaos_map
+
+        n_grid = int(type_arg) if len(sys.argv) > 2 else 128
+        chaos_map(n_grid, n_grid, sali=True, dtype=dtype, folder_name=folder_name)
+    elif mode_arg == "flip":
+        # grid resolution of the flip-time map, e.g. python run.py flip 4096
+        from flipmap import flip_time_map
+
+        n_grid = int(type_arg) if len(sys.argv) > 2 else 512
+        flip_time_map(n_grid, dtype=dtype, folder_name=folder_name)
+    elif mode_arg == "explore":
+        # interactive Poincare section at the energy DeltaE, e.g. python run.py explore 12
+        from explorer import poincare_explorer
+
+        poincare_explorer(float(type_arg) if len(sys.argv) > 2 else 12)
+    elif mode_arg == "sweep":
+        # chaos over (m2/m1, L2/L1) grids, e.g. python run.py sweep 5 15 30 (energies)
+        from sweep import parameter_sweep
+
+        ratios = [0.25, 0.5, 1.0, 2.0, 4.0]
+        energies = [float(E) for E in sys.argv[2:]] or [5, 15, 30]
+        parameter_sweep(ratios, ratios, energies, folder_name=folder_name)
+    elif mode_arg == "section":
+        # streamed, resumable Poincare section, e.g. python run.py section 1000000 12 --keep-cache
+        from dynamics import poincare_section, find_initial_conditions
+
+        Np = int(type_arg) if len(sys.argv) > 2 else 100000
+        DeltaE = float(sys.argv[3]) if len(sys.argv) > 3 else 12
+        store_folder = os.path.join(sections_folder, f"DeltaE_{DeltaE:g}")
+        poincare_section(
+            find_initial_conditions(DeltaE),
+            Np,
+            1,
+            store_folder=store_folder,
+            profile=profile,
+        )
+        print(f"Poincare section stored in: {store_folder}")
     else:
         print(f"Invalid mode: {mode_arg}")
         sys.exit(1)
+
+    profile.write(folder_name)
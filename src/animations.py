@@ -1,95 +1,88 @@
 import numpy as np
-from scipy.integrate import solve_ivp
 import matplotlib.pyplot as plt
 from matplotlib.animation import FuncAnimation
-from tqdm import tqdm
-import time
 import os
 
 from fractal import calculate_fractal_dimension
-
-# Constants
-g = 10  # m/s^2 (for simplicity g = 10)
-m1, m2 = 1.0, 1.0  # kg
-L1, L2 = 1.0, 1.0  # m
-
-
-# Lagrange equations (the differential equations equivalent to the Newton's equations)
-def lagrange_equations(t, y):
-    q1, q2, omega1, omega2 = y
-
-    q1_dot = omega1
-    q2_dot = omega2
-
-    c_12 = L2 / L1 * m2 / (m1 + m2) * np.cos(q1 - q2)
-    c_21 = L1 / L2 * np.cos(q1 - q2)
-    C1 = -L2 / L1 * m2 / (m1 + m2) * omega2 * omega2 * np.sin(
-        q1 - q2
-    ) - g / L1 * np.sin(q1)
-    C2 = L1 / L2 * omega1 * omega1 * np.sin(q1 - q2) - g / L2 * np.sin(q2)
-
-    omega1_dot = (C1 - c_12 * C2) / (1 - c_12 * c_21)
-    omega2_dot = (C2 - c_21 * C1) / (1 - c_12 * c_21)
-
-    return [q1_dot, q2_dot, omega1_dot, omega2_dot]
-
-
-# Initial conditions are fixed in terms of the total energy
-
-
-def find_initial_conditions(DeltaE):
-
-    if DeltaE < 0:
-        print("DeltaE must be positive")
-        return [0.0, 0.0, 0.0, 0.0]
-    elif DeltaE < 2 * m2 * g * L2:
-        print("The lower pendulum is tilted at the initial moment")
-        q2_0 = np.acos(1 - DeltaE / (m2 * g * L2))
-        return [0.0, q2_0, 0.0, 0.0]
-    elif DeltaE < 2 * (m1 + m2) * g * L1 + 2 * m2 * g * L2:
-        print(
-            "The lower pendulum is in the vertical position (q2_0=pi); the upper pendulum is tilted at the initial moment"
-        )
-        q2_0 = np.pi
-        q1_0 = np.acos((2 * m2 * g * L2 - DeltaE) / (2 * (m1 + m2) * g * L1))
-        return [q1_0, q2_0, 0.0, 0.0]
-    else:
-        print(
-            "Both pendulums are in the vertical position (q1_0=q2_0=pi) and the pendulum 2 has an angular velocity"
-        )
-        q1_0 = np.pi
-        q2_0 = np.pi
-        omega2_0 = np.sqrt(
-            2 * (DeltaE - (2 * (m1 + m2) * g * L1 + 2 * m2 * g * L2)) / (m2 * L2**2)
-        )
-        return [q1_0, q2_0, 0.0, omega2_0]
-
-
-def pendulum_animation():
+from trails import Trail
+from density import DensityImage
+from trajectory import Trajectory
+from trajectory_store import stream_trajectory
+from export import export_animation
+from profiling import RunProfile
+
+# the physics lives in dynamics.py (importable without matplotlib); re-exported here
+from dynamics import (
+    g,
+    m1,
+    m2,
+    L1,
+    L2,
+    lagrange_equations,
+    lagrange_jacobian,
+    hamilton_equations,
+    to_canonical,
+    from_canonical,
+    find_initial_conditions,
+    cache_parameters,
+    integrate_trajectory,
+    rest_initial_conditions,
+    normalize_vector_angle,
+    normalize_angle,
+    compute_observables,
+    interpolate_observables,
+    section_observable,
+    section_crossings,
+    poincare_section,
+    adaptive_poincare_section,
+    labels,
+)
+
+
+def pendulum_animation(
+    method="DOP853",
+    cache=None,
+    trail_length=None,
+    fade=False,
+    video=None,
+    profile=None,
+    n_samples=10000,
+    **export,
+):
+    """
+    trail_length: number of positions of the lower bob kept in its trail
+    (None: the whole trajectory); fade=True fades the trail out (needs trail_length).
+    video: optional file name; the animation is then rendered headless into it
+    (see export_animation, which also takes the extra keyword arguments).
+    profile: optional RunProfile recording the integration and the rendering.
+    n_samples: number of animation samples over the trajectory, evaluated from
+    one dense solve (see Trajectory), so it can change without integrating again.
+    """
+    if profile is None:
+        profile = RunProfile()
 
     DeltaE = 75
     y0 = find_initial_conditions(DeltaE)
 
     t_span = (0, 100)
-    t_eval = np.linspace(*t_span, 10000)
 
     print("Double Pendulum Animation")
-    sol = solve_ivp(
-        lagrange_equations,
-        t_span,
-        y0,
-        t_eval=t_eval,
-        method="DOP853",
-        rtol=1e-10,
-        atol=1e-10,
-    )
-    q1, q2 = sol.y[0], sol.y[1]
-
-    # Convert to Cartesian coordinates
-    x1 = L1 * np.sin(q1)
-    y1 = -L1 * np.cos(q1)
-    x2 = x1 + L2 * np.sin(q2)
-    y2 = y1 - L2 * np.cos(q2)
+    trajectory = Trajectory(y0, t_span, method=method, cache=cache, profile=profile)
+    t_samples = trajectory.times(n_samples)
+
+    if video is not None:
+        with profile.timer("rendering"):
+            export_animation(
+                "pendulum",
+                trajectory.cartesian(t_samples),
+                n_samples,
+                video,
+                source_fps=50,
+                trail_length=trail_length,
+                fade=fade,
+                **export,
+            )
+        return
 
     # Animation
     fig, ax = plt.subplots()
@@ -101,30 +94,24 @@ def pendulum_animation():
     ax.set_title("Double Pendulum Animation")
     ax.grid(True)
     (line,) = ax.plot([], [], "o-", lw=2)
-    (trail,) = ax.plot([], [], "r-", alpha=0.4, lw=1)
-
-    x2_trail, y2_trail = [], []
+    trail = Trail(ax, n_samples, trail_length, fade, color="r", alpha=0.4, lw=1, ls="-")
 
     def init():
         line.set_data([], [])
-        trail.set_data([], [])
-        return line, trail
+        return line, trail.clear()
 
     def update(frame):
-        x = [0, x1[frame], x2[frame]]
-        y = [0, y1[frame], y2[frame]]
-        line.set_data(x, y)
-        x2_trail.append(x2[frame])
-        y2_trail.append(y2[frame])
-        trail.set_data(x2_trail, y2_trail)
-        return line, trail
+        # the positions of the bobs are evaluated frame by frame
+        x1, y1, x2, y2 = trajectory.cartesian(t_samples[frame])
+        line.set_data([0, x1, x2], [0, y1, y2])
+        return line, trail.append(x2, y2)
 
     ani = FuncAnimation(
         fig,
         update,
-        frames=len(t_eval),
+        frames=n_samples,
         init_func=init,
-        blit=False,
+        blit=True,
         interval=20,
     )
     plt.title("Double Pendulum Animation (Lagrange equations)")
@@ -132,75 +119,25 @@ def pendulum_animation():
     plt.show()
 
 
-def normalize_vector_angle(angle):
-    normalized_angle = np.fmod(angle, 2 * np.pi)
-    normalized_angle = np.where(
-        normalized_angle > np.pi, normalized_angle - 2 * np.pi, normalized_angle
-    )
-    normalized_angle = np.where(
-        normalized_angle < -np.pi, normalized_angle + 2 * np.pi, normalized_angle
-    )
-    return normalized_angle
-
-
-def normalize_angle(angle):
-    normalized_angle = np.fmod(angle, 2 * np.pi)
-    normalized_angle = (
-        normalized_angle - 2 * np.pi if normalized_angle > np.pi else normalized_angle
-    )
-    normalized_angle = (
-        normalized_angle + 2 * np.pi if normalized_angle < -np.pi else normalized_angle
-    )
-    return normalized_angle
-
-
-def compute_observables(y):
-
-    q1, q2, omega1, omega2 = y
-    p1 = (m1 + m2) * L1 * L1 * omega1 + m2 * L1 * L2 * omega2 * np.cos(q1 - q2)
-    p2 = m2 * L2 * L2 * omega2 + m2 * L1 * L2 * omega1 * np.cos(q1 - q2)
-
-    T = (
-        m1 * L1 * L1 * omega1 * omega1 / 2
-        + m2
-        * (
-            L1 * L1 * omega1 * omega1
-            + L2 * L2 * omega2 * omega2
-            + 2 * L1 * L2 * omega1 * omega2 * np.cos(q1 - q2)
-        )
-        / 2
-    )
-    V = -(m1 + m2) * g * L1 * np.cos(q1) - m2 * L2 * g * np.cos(q2)
-    omega1 = normalize_angle(omega1)
-    omega2 = normalize_angle(omega2)
-
-    return [q1, q2, omega1, omega2, p1, p2, T + V]
-
-
-def interpolate_observables(observable_old, observable_new, i_section):
-    a_1 = observable_old[i_section]
-    a_2 = observable_new[i_section]
-
-    if a_1 * a_2 > 0:
-        print("Error: The section is not crossed")
-        exit()
-    else:
-        observable = np.zeros(len(observable_old))
-        slope = -a_1 / (a_2 - a_1)
-        for i in range(len(observable_old)):
-            b_1 = observable_old[i]
-            b_2 = observable_new[i]
-            res = slope * (b_2 - b_1) + b_1
-            if i == 0 or i == 1:
-                res = normalize_angle(res)
-            observable[i] = res
-        return observable
-
-
-labels = ["q1", "q2", "omega1", "omega2", "p1", "p2"]
-
-
-def trajectory_animation():
+def trajectory_animation(
+    method="DOP853",
+    cache=None,
+    trail_length=None,
+    fade=False,
+    video=None,
+    profile=None,
+    n_samples=10000,
+    t_max=100,
+    store_folder=None,
+    n_stored=None,
+    **export,
+):
+    # trail_length, fade, video, profile, n_samples: as in pendulum_animation
+    # store_folder: stream the run (n_stored samples, default 1000 per unit of time)
+    # into a TrajectoryStore there and animate its samples at about n_samples evenly
+    # spaced times (TrajectoryStore.resampled), for runs too long for memory
+    if profile is None:
+        profile = RunProfile()
     # index  of the observable to plot
     i1 = 0
     i2 = 1
@@ -216,29 +153,58 @@ def trajectory_animation():
     DeltaE = 25
     y0 = find_initial_conditions(DeltaE)
 
-    t_span = (0, 100)
-    t_eval = np.linspace(*t_span, 10000)
+    t_span = (0, t_max)
 
     print("Double Pendulum trajectory")
-    sol = solve_ivp(
-        lagrange_equations,
-        t_span,
-        y0,
-        t_eval=t_eval,
-        method="DOP853",
-        rtol=1e-10,
-        atol=1e-10,
-    )
-
-    observables = compute_observables(sol.y)
-
-    # normalize the observables
-    observables[0] = normalize_vector_angle(observables[0])
-    observables[1] = normalize_vector_angle(observables[1])
-    for i in range(2, 6):
-        den = np.max(np.abs(observables[i]))
-        if den != 0:
-            observables[i] = observables[i] / den
+    if store_folder is None:
+        trajectory = Trajectory(y0, t_span, method=method, cache=cache, profile=profile)
+        t_samples = trajectory.times(n_samples)
+        evaluate = trajectory.observables
+        # normalize the observables, by their maxima over the solver steps
+        scale = np.max(np.abs(compute_observables(trajectory.y)), axis=1, keepdims=True)
+    else:
+        store = stream_trajectory(
+            store_folder,
+            y0,
+            t_span,
+            n_stored or int(1000 * t_max) + 1,
+            method=method,
+            profile=profile,
+        )
+        # one frame per sample, so the samples must be evenly spaced in time
+        t_samples, resampled = store.resampled(n=n_samples)
+        n_samples = len(t_samples)
+
+        def evaluate(t):
+            return resampled[:, np.searchsorted(t_samples, t)]
+
+        # normalize the observables, by their maxima over the whole run
+        lo, hi = store.extremes()
+        scale = np.maximum(np.abs(lo), np.abs(hi))[:, None]
+    scale[scale == 0] = 1
+
+    def normalized_observables(t):
+        # t: an array of times
+        observables = evaluate(t)
+        observables[0] = normalize_vector_angle(observables[0])
+        observables[1] = normalize_vector_angle(observables[1])
+        observables[2:6] /= scale[2:6]
+        return observables
+
+    if video is not None:
+        observables = normalized_observables(t_samples)
+        with profile.timer("rendering"):
+            export_animation(
+                "trajectory",
+                (observables[i1], observables[i2], labels[i1], labels[i2]),
+                n_samples,
+                video,
+                source_fps=500,
+                trail_length=trail_length,
+                fade=fade,
+                **export,
+            )
+        return
 
     # Animation
     fig, ax = plt.subplots()
@@ -247,26 +213,21 @@ def trajectory_animation():
     ax.set_ylim(-1.2, 1.2)
     ax.set_xlabel(labels[i1])
     ax.set_ylabel(labels[i2])
-    (trail,) = ax.plot([], [], "r-", alpha=0.4, lw=1)
-
-    q1_trail, q2_trail = [], []
+    trail = Trail(ax, n_samples, trail_length, fade, color="r", alpha=0.4, lw=1, ls="-")
 
     def init():
-        trail.set_data([], [])
-        return trail
+        return (trail.clear(),)
 
     def update(frame):
-        q1_trail.append(observables[i1][frame])
-        q2_trail.append(observables[i2][frame])
-        trail.set_data(q1_trail, q2_trail)
-        return trail
+        observables = normalized_observables(t_samples[frame : frame + 1])
+        return (trail.append(observables[i1, 0], observables[i2, 0]),)
 
     ani = FuncAnimation(
         fig,
         update,
-        frames=len(t_eval),
+        frames=n_samples,
         init_func=init,
-        blit=False,
+        blit=True,
         interval=2,
     )
     plt.title("Double Pendulum trajectory (" + labels[i1] + ", " + labels[i2] + ")")
@@ -274,7 +235,34 @@ def trajectory_animation():
     plt.show()
 
 
-def poincare_animation(folder_name="."):
+def poincare_animation(
+    folder_name=".",
+    method="DOP853",
+    cache=None,
+    video=None,
+    profile=None,
+    render="points",
+    norm="log",
+    adaptive=False,
+    tolerance=0.01,
+    max_points=10**6,
+    store_folder=None,
+    **export,
+):
+    """
+    video, profile: as in pendulum_animation.
+    adaptive: instead of a fixed Np, compute points until the box-counting
+    dimension changes by at most tolerance when their number doubles (at most
+    max_points); see adaptive_poincare_section.
+    render: "points" draws every point of the section figure as a marker;
+    "density" bins them into a DensityImage at the resolution of the saved
+    figure and shows the counts on the norm scale ("log", "equalize", "linear").
+    store_folder: stream the section into a SectionStore there (see
+    poincare_section), so an interrupted computation resumes; the points are
+    still loaded whole, for the fractal dimension and the animation.
+    """
+    if profile is None:
+        profile = RunProfile()
 
     print("Double Pendulum poincare section")
 
@@ -299,39 +287,36 @@ def poincare_animation(folder_name="."):
 
     DeltaE = 12
     y0 = find_initial_conditions(DeltaE)
-    observable_old = compute_observables(y0)
 
-    t_0 = 0
-    dt = 0.01
     print(f"Calculating {Np} points in the Poincare section")
 
     num_boxes = 7
 
-    Observables = np.zeros((7, Np))
-    N_filled_points = 0
-
-    pbar = tqdm(total=Np)
-    while N_filled_points < Np:
-        sol = solve_ivp(
-            lagrange_equations,
-            (t_0, t_0 + dt),
+    if adaptive:
+        Observables, estimates = adaptive_poincare_section(
             y0,
-            method="DOP853",
-            rtol=1e-10,
-            atol=1e-10,
+            i_section,
+            i1,
+            i2,
+            tolerance=tolerance,
+            max_points=max_points,
+            num_boxes=num_boxes,
+            method=method,
+            profile=profile,
+        )
+        print(
+            f"Dimension {estimates[1, -1]:.4f} converged at {Observables.shape[1]} points"
+        )
+    else:
+        Observables = poincare_section(
+            y0,
+            Np,
+            i_section,
+            method=method,
+            cache=None if store_folder else cache,
+            store_folder=None if adaptive else store_folder,
+            profile=profile,
         )
-        y = sol.y[:, -1]
-        observable_new = compute_observables(y)
-        if observable_new[i_section] * observable_old[i_section] < 0:
-            Observables[:, N_filled_points] = interpolate_observables(
-                observable_old, observable_new, i_section
-            )
-            N_filled_points += 1
-            pbar.update(1)
-        observable_old = observable_new
-        t_0 += dt
-        y0 = y
-    pbar.close()
 
     for i in range(0, 2):
         Observables[i] /= np.pi  # normalize the observables
@@ -359,11 +344,22 @@ def poincare_animation(folder_name="."):
         + " points"
     )
     ax.grid(True)
-    ax.plot(
-        Observables[i1], Observables[i2], ",", color="r", alpha=0.2, markersize=0.05
-    )
     fig_name = os.path.join(folder_name, "poincare_section.png")
-    plt.savefig(fig_name, dpi=300)
+    with profile.timer("rendering"):
+        if render == "density":
+            density = DensityImage.for_axes(ax, dpi=300)
+            density.add(Observables[i1], Observables[i2])
+            density.draw(ax, norm)
+        else:
+            ax.plot(
+                Observables[i1],
+                Observables[i2],
+                ",",
+                color="r",
+                alpha=0.2,
+                markersize=0.05,
+            )
+        plt.savefig(fig_name, dpi=300)
     plt.show()
     plt.close()
 
@@ -373,8 +369,29 @@ def poincare_animation(folder_name="."):
         i2=i2,
         folder_name=folder_name,
         num_boxes=num_boxes,
+        profile=profile,
     )
 
+    if video is not None:
+        title = (
+            "Double Pendulum Poincare section ("
+            + labels[i1]
+            + ", "
+            + labels[i2]
+            + ")\nat zero "
+            + labels[i_section]
+        )
+        with profile.timer("rendering"):
+            export_animation(
+                "Poincare",
+                (Observables[i1], Observables[i2], labels[i1], labels[i2], title),
+                len(Observables[0]),
+                video,
+                source_fps=5000,
+                **export,
+            )
+        return
+
     # Animation
     fig, ax = plt.subplots()
     ax.set_aspect("equal")
@@ -382,42 +399,42 @@ def poincare_animation(folder_name="."):
     ax.set_ylim(-1.2, 1.2)
     ax.set_xlabel(labels[i1])
     ax.set_ylabel(labels[i2])
-    (trail,) = ax.plot([], [], ",", color="r", alpha=0.2, markersize=0.05)
-
-    q1_trail, q2_trail = [], []
-    animation_title = ax.set_title("")
+    trail = Trail(
+        ax,
+        len(Observables[0]),
+        ls="",
+        marker=",",
+        color="r",
+        alpha=0.2,
+        markersize=0.05,
+    )
+    ax.set_title(
+        "Double Pendulum Poincare section ("
+        + labels[i1]
+        + ", "
+        + labels[i2]
+        + ")\nat zero "
+        + labels[i_section]
+    )
+    # the frame counter is drawn inside the axes, where blitting redraws it
+    counter = ax.text(0.02, 0.97, "", transform=ax.transAxes, va="top")
 
     def init():
-        trail.set_data([], [])
-        animation_title.set_text("")
-        return trail
+        counter.set_text("")
+        return trail.clear(), counter
 
     def update(frame):
-        for i in range(0, 10):
-            q1_trail.append(Observables[i1][frame * 10 + i])
-            q2_trail.append(Observables[i2][frame * 10 + i])
-        trail.set_data(q1_trail, q2_trail)
-        animation_title.set_text(
-            "Double Pendulum Poincare section ("
-            + labels[i1]
-            + ", "
-            + labels[i2]
-            + ")\nat zero "
-            + labels[i_section]
-            + " frame "
-            + str(frame * 10)
-            + "/"
-            + str(len(Observables[0]))
-        )
-
-        return trail
+        points = slice(frame * 10, frame * 10 + 10)
+        trail.extend(Observables[i1][points], Observables[i2][points])
+        counter.set_text("frame " + str(frame * 10) + "/" + str(len(Observables[0])))
+        return trail.artist, counter
 
     ani = FuncAnimation(
         fig,
         update,
         frames=len(Observables[0]) // 10,
         init_func=init,
-        blit=False,
+        blit=True,
         interval=2,
     )
 
@@ -0,0 +1,144 @@
+import numpy as np
+from matplotlib import colormaps
+from matplotlib.figure import Figure
+from tqdm import tqdm
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import os
+
+from dynamics import (
+    labels,
+    poincare_section,
+    rest_initial_conditions,
+    shell_initial_conditions,
+)
+
+
+def atlas_section(i_energy, i_orbit, y0, Np, i_section, t_max, method):
+    # one Poincare section of the atlas (runs in a worker process)
+    Observables = poincare_section(
+        y0, Np, i_section, t_bound=t_max, method=method, progress=False
+    )
+    return i_energy, i_orbit, Observables
+
+
+def poincare_atlas(
+    energies,
+    n_orbits=8,
+    Np=2000,
+    i1=0,
+    i2=4,
+    i_section=1,
+    t_max=1e5,
+    method="DOP853",
+    workers=None,
+    folder_name=".",
+    sampling=None,
+):
+    """
+    Poincare sections of n_orbits orbits for every energy DeltaE in energies.
+    The (energy, orbit) sections are computed in parallel on a process pool
+    (workers=None: one process per CPU) and collected into one array store:
+      atlas_sections.npy  (len(energies), n_orbits, 7, Np) observables at the crossings
+                          (NaN where an orbit did not cross the section Np times before t_max)
+      atlas_index.npz     energies, initial conditions (len(energies), n_orbits, 4), i_section
+    plus the tiled overview figure poincare_atlas.png (one tile per energy).
+    sampling: None starts the orbits from rest (rest_initial_conditions); "grid",
+    "stratified" or "random" spreads them over the section plane instead (see
+    shell_initial_conditions), which fills the section with far fewer points
+    per orbit.
+    """
+    energies = np.asarray(energies, dtype=float)
+    if sampling is None:
+        initial_conditions = np.array(
+            [rest_initial_conditions(E, n_orbits).T for E in energies]
+        )
+    else:
+        initial_conditions = np.array(
+            [
+                shell_initial_conditions(E, n_orbits, i_section, sampling).T
+                for E in energies
+            ]
+        )
+
+    sections = np.lib.format.open_memmap(
+        os.path.join(folder_name, "atlas_sections.npy"),
+        mode="w+",
+        dtype=float,
+        shape=(len(energies), n_orbits, 7, Np),
+    )
+    np.savez(
+        os.path.join(folder_name, "atlas_index.npz"),
+        energies=energies,
+        initial_conditions=initial_conditions,
+        i_section=i_section,
+    )
+
+    print(f"Calculating {len(energies)} x {n_orbits} Poincare sections of {Np} points")
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = [
+            executor.submit(
+                atlas_section,
+                i_energy,
+                i_orbit,
+                initial_conditions[i_energy, i_orbit],
+                Np,
+                i_section,
+                t_max,
+                method,
+            )
+            for i_energy in range(len(energies))
+            for i_orbit in range(n_orbits)
+        ]
+        for future in tqdm(as_completed(futures), total=len(futures)):
+            i_energy, i_orbit, Observables = future.result()
+            sections[i_energy, i_orbit] = Observables
+    sections.flush()
+
+    plot_atlas(sections, energies, i1, i2, i_section, folder_name=folder_name)
+    return sections, initial_conditions
+
+
+def plot_atlas(sections, energies, i1=0, i2=4, i_section=1, folder_name="."):
+    # tiled overview of the atlas: one tile per energy, one color per orbit
+    n_cols = int(np.ceil(np.sqrt(len(energies))))
+    n_rows = int(np.ceil(len(energies) / n_cols))
+
+    fig = Figure(figsize=(4 * n_cols, 4 * n_rows), layout="constrained")
+    axes = fig.subplots(n_rows, n_cols, squeeze=False)
+    colors = colormaps["viridis"](np.linspace(0, 1, sections.shape[1]))
+
+    for ax in axes.flat[len(energies) :]:
+        ax.set_visible(False)
+
+    for ax, DeltaE, tile in zip(axes.flat, energies, sections):
+        # normalize the observables as in poincare_animation (over all orbits of the tile)
+        xy = []
+        for i in (i1, i2):
+            values = tile[:, i]
+            if i < 2:
+                den = np.pi
+            else:
+                den = np.nanmax(np.abs(values)) if np.any(np.isfinite(values)) else 0
+            xy.append(values / den if den != 0 else values)
+
+        for orbit, color in enumerate(colors):
+            ax.plot(xy[0][orbit], xy[1][orbit], ",", color=color, alpha=0.5)
+        ax.set_aspect("equal")
+        ax.set_xlim(-1.2, 1.2)
+        ax.set_ylim(-1.2, 1.2)
+        ax.set_xlabel(labels[i1])
+        ax.set_ylabel(labels[i2])
+        ax.set_title(f"DeltaE = {DeltaE:g}")
+        ax.grid(True)
+
+    fig.suptitle(
+        "Double Pendulum Poincare atlas ("
+        + labels[i1]
+        + ", "
+        + labels[i2]
+        + ") at zero "
+        + labels[i_section]
+    )
+    fig_name = os.path.join(folder_name, "poincare_atlas.png")
+    fig.savefig(fig_name, dpi=200, bbox_inches="tight")
+    print(f"Poincare atlas saved to: {fig_name}")
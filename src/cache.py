@@ -0,0 +1,102 @@
+import numpy as np
+import hashlib
+import os
+import tempfile
+import time
+
+
+class TrajectoryCache:
+    """
+    Content-addressed on-disk cache of integrated trajectories (or any array result).
+    Every entry is one .npy file named by the SHA-256 hash of the parameters that
+    produced it, memory-mapped back in on a hit. When the files exceed max_bytes,
+    the least recently used ones are evicted.
+    """
+
+    # temporary files older than this are left by crashed writers and are removed
+    stale_seconds = 3600
+
+    def __init__(self, folder, max_bytes=2 * 1024**3):
+        self.folder = folder
+        self.max_bytes = max_bytes
+        os.makedirs(folder, exist_ok=True)
+
+    @staticmethod
+    def key(params):
+        # hash of the parameters, independent of their order; arrays are hashed by value
+        digest = hashlib.sha256()
+        for name in sorted(params):
+            value = params[name]
+            digest.update(name.encode())
+            if isinstance(value, str) or value is None:
+                digest.update(repr(value).encode())
+            else:
+                value = np.asarray(value, dtype=float)
+                digest.update(repr(value.shape).encode())
+                digest.update(np.ascontiguousarray(value).tobytes())
+        return digest.hexdigest()
+
+    def path(self, params):
+        return os.path.join(self.folder, self.key(params) + ".npy")
+
+    def load(self, params):
+        # the cached array (memory-mapped, read-only), or None on a miss
+        path = self.path(params)
+        if not os.path.exists(path):
+            return None
+        os.utime(path)  # mark as recently used
+        return np.load(path, mmap_mode="r")
+
+    def store(self, params, array):
+        path = self.path(params)
+        # write to a temporary file of this writer first, so a crash never leaves a
+        # truncated entry and processes storing the same key do not collide
+        with tempfile.NamedTemporaryFile(
+            dir=self.folder,
+            prefix=self.key(params) + ".",
+            suffix=".tmp.npy",
+            delete=False,
+        ) as f:
+            tmp_path = f.name
+            try:
+                np.save(f, array)
+            except BaseException:
+                f.close()
+                os.remove(tmp_path)
+                raise
+        os.replace(tmp_path, path)
+        self.evict(keep=path)
+        return np.load(path, mmap_mode="r")
+
+    def evict(self, keep=None):
+        """
+        Deletes the least recently used entries until the cache fits in max_bytes,
+        and the temporary files older than stale_seconds. Other processes may
+        evict at the same time, so files can disappear while this runs.
+        """
+        entries = []
+        now = time.time()
+        for name in os.listdir(self.folder):
+            path = os.path.join(self.folder, name)
+            if not name.endswith(".npy"):
+                continue
+            try:
+                stat = os.stat(path)
+                if not name.endswith(".tmp.npy"):
+                    entries.append((stat.st_mtime, stat.st_size, path))
+                elif now - stat.st_mtime > self.stale_seconds:
+                    os.remove(path)
+            except FileNotFoundError:
+                pass
+        entries.sort()
+
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in entries:
+            if total <= self.max_bytes:
+                break
+            if path != keep:
+                try:
+                    os.remove(path)
+                except FileNotFoundError:
+                    pass
+                total -= size
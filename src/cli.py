@@ -0,0 +1,441 @@
+"""
+Headless batch command line: computes arrays and writes them to files, without
+opening windows and without wiping the output folder.
+
+    python run.py simulate --energy 12 25 --t-max 100 --n-eval 10000
+    python run.py poincare --energy 12 --np 10000 --i-section 1
+    python run.py fractal data/poincare_DeltaE_12.npy --i1 0 --i2 4 --num-boxes 7
+    python run.py render data/poincare_DeltaE_12.npy data/poincare_DeltaE_12.png
+
+Every option can also be given in a JSON config file (--config), whose keys are
+the option names with underscores (e.g. {"energy": [12], "np": 10000}); options
+on the command line override it.
+Only argparse and json are imported at startup: every subcommand imports what it
+needs (numpy and scipy for the computations, matplotlib only for render), which
+keeps the start-up cost low for many small jobs launched from a scheduler.
+"""
+
+import argparse
+import json
+import os
+
+script_dir = os.path.dirname(os.path.abspath(__file__))
+default_output = os.path.join(script_dir, "..", "data")
+
+
+def add_solver_arguments(parser):
+    parser.add_argument("--method", default="DOP853")
+    parser.add_argument("--rtol", type=float, default=1e-10)
+    parser.add_argument("--atol", type=float, default=1e-10)
+    parser.add_argument(
+        "--dt", type=float, default=0.01, help="step of the symplectic methods"
+    )
+
+
+def output_path(args, name):
+    os.makedirs(args.output, exist_ok=True)
+    return os.path.join(args.output, name)
+
+
+def write_profile(args, profile):
+    if args.profile:
+        profile.write(args.output)
+
+
+def simulate(args):
+    # trajectories (t, q1, q2, omega1, omega2) as (5, n_eval) arrays
+    import numpy as np
+    from dynamics import find_initial_conditions, integrate_trajectory
+    from profiling import RunProfile
+
+    profile = RunProfile("simulate")
+    for DeltaE in args.energy:
+        if args.store:
+            from trajectory_store import stream_trajectory
+
+            path = output_path(args, f"trajectory_DeltaE_{DeltaE:g}")
+            stream_trajectory(
+                path,
+                find_initial_conditions(DeltaE),
+                (0, args.t_max),
+                args.n_eval,
+                method=args.method,
+                rtol=args.rtol,
+                atol=args.atol,
+                dt=args.dt,
+                progress=args.progress,
+                profile=profile,
+            )
+            print(f"Trajectory store saved to: {path}")
+            continue
+        t_eval = np.linspace(0, args.t_max, args.n_eval)
+        t, y = integrate_trajectory(
+            find_initial_conditions(DeltaE),
+            (0, args.t_max),
+            t_eval,
+            method=args.method,
+            rtol=args.rtol,
+            atol=args.atol,
+            dt=args.dt,
+            profile=profile,
+        )
+        path = output_path(args, f"trajectory_DeltaE_{DeltaE:g}.npy")
+        np.save(path, np.vstack((t, y)))
+        print(f"Trajectory saved to: {path}")
+    write_profile(args, profile)
+
+
+def poincare(args):
+    # Poincare sections as (7, Np) arrays of observables at the crossings
+    import numpy as np
+    from dynamics import (
+        adaptive_poincare_section,
+        find_initial_conditions,
+        poincare_section,
+    )
+    from profiling import RunProfile
+
+    profile = RunProfile("poincare")
+    for DeltaE in args.energy:
+        name = f"poincare_DeltaE_{DeltaE:g}"
+        if args.tolerance is not None:
+            Observables, estimates = adaptive_poincare_section(
+                find_initial_conditions(DeltaE),
+                args.i_section,
+                tolerance=args.tolerance,
+                max_points=args.np,
+                t_bound=args.t_max,
+                method=args.method,
+                rtol=args.rtol,
+                atol=args.atol,
+                dt=args.dt,
+                progress=args.progress,
+                profile=profile,
+            )
+            np.save(output_path(args, name + "_convergence.npy"), estimates)
+            path = output_path(args, name + ".npy")
+            np.save(path, Observables)
+            print(
+                f"Poincare section of {Observables.shape[1]} points"
+                f" (dimension {estimates[1, -1]:.4f}) saved to: {path}"
+            )
+            continue
+        Observables = poincare_section(
+            find_initial_conditions(DeltaE),
+            args.np,
+            args.i_section,
+            t_bound=args.t_max,
+            method=args.method,
+            rtol=args.rtol,
+            atol=args.atol,
+            dt=args.dt,
+            progress=args.progress,
+            store_folder=output_path(args, name) if args.stream else None,
+            profile=profile,
+        )
+        path = output_path(args, name + ".npy")
+        np.save(path, Observables)
+        print(f"Poincare section saved to: {path}")
+    write_profile(args, profile)
+
+
+def fractal(args):
+    # fractal dimension of saved Poincare sections, as <input>_fractal_<estimator>.json
+    import numpy as np
+    from dynamics import normalize_observables
+    from fractal import (
+        box_counting_dimension,
+        calculate_fractal_dimension,
+        correlation_dimension,
+        information_dimension,
+    )
+    from profiling import RunProfile
+
+    profile = RunProfile("fractal")
+    for input_path in args.input:
+        Observables = np.load(input_path)
+        points = normalize_observables(Observables)
+        points = points[:, np.isfinite(points[args.i1]) & np.isfinite(points[args.i2])]
+        if args.frames:
+            calculate_fractal_dimension(
+                points,
+                args.i1,
+                args.i2,
+                num_boxes=args.num_boxes,
+                folder_name=args.output,
+                profile=profile,
+            )
+        result = {
+            "input": input_path,
+            "i1": args.i1,
+            "i2": args.i2,
+            "n_points": int(points.shape[1]),
+            "estimator": args.estimator,
+        }
+        phase = (
+            "box_counting" if args.estimator == "box" else args.estimator + "_dimension"
+        )
+        with profile.timer(phase):
+            if args.estimator == "box":
+                dimension, box_sizes, counts = box_counting_dimension(
+                    points, args.i1, args.i2, num_boxes=args.num_boxes
+                )
+                result["box_sizes"] = [float(r) for r in box_sizes]
+                result["occupied_boxes"] = [int(n) for n in counts]
+            else:
+                estimate = (
+                    correlation_dimension
+                    if args.estimator == "correlation"
+                    else information_dimension
+                )
+                dimension, radii, values, region = estimate(
+                    points,
+                    args.i1,
+                    args.i2,
+                    n_centers=args.n_centers,
+                    workers=args.workers,
+                )
+                result["radii"] = [float(r) for r in radii]
+                key = "correlation" if args.estimator == "correlation" else "masses"
+                result[key] = [float(value) for value in values]
+                result["scaling_region"] = [int(i) for i in region]
+        result["dimension"] = float(dimension)
+        # one file per estimator, so the estimates do not overwrite each other
+        name = os.path.splitext(os.path.basename(input_path))[0]
+        name += f"_fractal_{args.estimator}.json"
+        path = output_path(args, name)
+        with open(path, "w") as f:
+            json.dump(result, f, indent=2)
+        print(f"Fractal dimension {dimension:.4f} saved to: {path}")
+    write_profile(args, profile)
+
+
+def render(args):
+    """
+    Draws a saved array: a (7, Np) Poincare section as a scatter plot, or a
+    (5, T) trajectory in the (i1, i2) plane. An output ending in .png gives the
+    image; any other output is rendered headless as a video (see export_animation).
+    A TrajectoryStore folder (simulate --store) is read through its min/max
+    pyramid, decimated to the width of the image (a video takes evenly spaced
+    samples instead, as many as the width of its frames); a
+    SectionStore folder (poincare --stream) is binned into a --density image
+    chunk by chunk, without loading the whole section.
+    """
+    import numpy as np
+    from dynamics import compute_observables, normalize_observables, labels, L1, L2
+    from profiling import RunProfile
+
+    profile = RunProfile("render")
+    section = None
+    if os.path.isdir(args.input) and os.path.exists(
+        os.path.join(args.input, "samples.npy")
+    ):
+        from trajectory_store import TrajectoryStore
+
+        store = TrajectoryStore.open(args.input)
+        if args.output_file.endswith(".png"):
+            t, observables = store.decimated((args.i1, args.i2), n=8 * args.dpi)
+        else:
+            # one video frame per sample: evenly spaced times, not the extrema
+            t, observables = store.resampled(n=args.size[0])
+        array = np.vstack((t, observables[:4]))
+    elif os.path.isdir(args.input):
+        from section_store import SectionStore
+
+        section = SectionStore.open(args.input)
+        if not (args.density and args.output_file.endswith(".png")):
+            array, section = section.load(), None
+        else:
+            array = np.zeros((7, 0))  # binned from the chunks below
+    else:
+        array = np.load(args.input)
+    if array.shape[0] == 7:
+        points = normalize_observables(array)
+        scene = "Poincare"
+    else:
+        points = normalize_observables(compute_observables(array[1:]))
+        points[:2] = ((points[:2] + 1) % 2) - 1  # angles wrapped into [-1, 1)
+        scene = "trajectory"
+    x, y = points[args.i1], points[args.i2]
+
+    with profile.timer("rendering"):
+        if args.output_file.endswith(".png"):
+            from matplotlib.figure import Figure
+
+            fig = Figure(figsize=(8, 8))
+            ax = fig.subplots()
+            ax.set_aspect("equal")
+            ax.set_xlim(-1.2, 1.2)
+            ax.set_ylim(-1.2, 1.2)
+            ax.set_xlabel(labels[args.i1])
+            ax.set_ylabel(labels[args.i2])
+            ax.grid(True)
+            if args.density:
+                from density import DensityImage
+
+                density = DensityImage.for_axes(ax, args.dpi)
+                if section is not None:
+                    density.add_section(section.chunks, args.i1, args.i2)
+                else:
+                    density.add(x, y)
+                density.draw(ax, args.norm)
+            else:
+                style = "," if scene == "Poincare" else "-"
+                ax.plot(x, y, style, color="r", alpha=0.4, lw=0.5)
+            fig.savefig(args.output_file, dpi=args.dpi)
+            print(f"Rendered {args.input} to: {args.output_file}")
+        else:
+            from export import export_animation
+
+            if args.pendulum and scene == "trajectory":
+                q1, q2 = array[1], array[2]
+                x1, y1 = L1 * np.sin(q1), -L1 * np.cos(q1)
+                scene, data = "pendulum", (
+                    x1,
+                    y1,
+                    x1 + L2 * np.sin(q2),
+                    y1 - L2 * np.cos(q2),
+                )
+            elif scene == "Poincare":
+                data = (x, y, labels[args.i1], labels[args.i2], "Poincare section")
+            else:
+                data = (x, y, labels[args.i1], labels[args.i2])
+            export_animation(
+                scene,
+                data,
+                len(x),
+                args.output_file,
+                source_fps=args.source_fps,
+                fps=args.fps,
+                size=tuple(args.size),
+                workers=args.workers,
+            )
+    write_profile(args, profile)
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(
+        prog="run.py", description="Headless double pendulum computations"
+    )
+    common = argparse.ArgumentParser(add_help=False)
+    common.add_argument("--config", help="JSON file of option values")
+    common.add_argument(
+        "--output", default=default_output, help="output folder (default: data/)"
+    )
+    common.add_argument(
+        "--profile", action="store_true", help="also write the run profile"
+    )
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    simulate_parser = subparsers.add_parser(
+        "simulate", parents=[common], help="integrate trajectories"
+    )
+    simulate_parser.add_argument("--energy", type=float, nargs="+", default=[25.0])
+    simulate_parser.add_argument("--t-max", type=float, default=100.0)
+    simulate_parser.add_argument("--n-eval", type=int, default=10000)
+    simulate_parser.add_argument(
+        "--store",
+        action="store_true",
+        help="stream into a chunked on-disk store with a min/max pyramid (resumable)",
+    )
+    simulate_parser.add_argument("--progress", action="store_true")
+    add_solver_arguments(simulate_parser)
+    simulate_parser.set_defaults(run=simulate)
+
+    poincare_parser = subparsers.add_parser(
+        "poincare", parents=[common], help="compute Poincare sections"
+    )
+    poincare_parser.add_argument("--energy", type=float, nargs="+", default=[12.0])
+    poincare_parser.add_argument(
+        "--np",
+        type=int,
+        default=10000,
+        help="number of points (with --tolerance: the cap)",
+    )
+    poincare_parser.add_argument(
+        "--tolerance",
+        type=float,
+        default=None,
+        help="stop once the box-counting dimension changes by at most this much"
+        " when the points double",
+    )
+    poincare_parser.add_argument("--i-section", type=int, default=1)
+    poincare_parser.add_argument("--t-max", type=float, default=float("inf"))
+    poincare_parser.add_argument(
+        "--stream",
+        action="store_true",
+        help="checkpoint the section to the output folder (resumable)",
+    )
+    poincare_parser.add_argument("--progress", action="store_true")
+    add_solver_arguments(poincare_parser)
+    poincare_parser.set_defaults(run=poincare)
+
+    fractal_parser = subparsers.add_parser(
+        "fractal", parents=[common], help="fractal dimension of sections"
+    )
+    fractal_parser.add_argument("input", nargs="+", help="(7, Np) .npy sections")
+    fractal_parser.add_argument("--i1", type=int, default=0)
+    fractal_parser.add_argument("--i2", type=int, default=4)
+    fractal_parser.add_argument(
+        "--estimator",
+        choices=("box", "correlation", "information"),
+        default="box",
+        help="box counting, or the KD-tree correlation / information dimension",
+    )
+    fractal_parser.add_argument("--num-boxes", type=int, default=7)
+    fractal_parser.add_argument("--n-centers", type=int, default=10000)
+    fractal_parser.add_argument(
+        "--workers", type=int, default=-1, help="threads of the KD-tree queries"
+    )
+    fractal_parser.add_argument(
+        "--frames", action="store_true", help="also render the box-counting frames"
+    )
+    fractal_parser.set_defaults(run=fractal)
+
+    render_parser = subparsers.add_parser(
+        "render", parents=[common], help="draw a saved section or trajectory"
+    )
+    render_parser.add_argument(
+        "input",
+        help=".npy section or trajectory, or a trajectory or section store folder",
+    )
+    render_parser.add_argument("output_file", help=".png image or video file")
+    render_parser.add_argument("--i1", type=int, default=0)
+    render_parser.add_argument("--i2", type=int, default=4)
+    render_parser.add_argument("--dpi", type=int, default=300)
+    render_parser.add_argument(
+        "--density",
+        action="store_true",
+        help="draw the number of points per pixel instead of the points",
+    )
+    render_parser.add_argument(
+        "--norm", choices=("log", "equalize", "linear"), default="log"
+    )
+    render_parser.add_argument(
+        "--pendulum", action="store_true", help="animate a trajectory as the pendulum"
+    )
+    render_parser.add_argument("--fps", type=float, default=30)
+    render_parser.add_argument("--source-fps", type=float, default=50)
+    render_parser.add_argument("--size", type=int, nargs=2, default=(1280, 720))
+    render_parser.add_argument("--workers", type=int, default=None)
+    render_parser.set_defaults(run=render)
+
+    return parser, subparsers.choices
+
+
+COMMANDS = ("simulate", "poincare", "fractal", "render")
+
+
+def main(argv=None):
+    parser, subparsers = build_parser()
+    args = parser.parse_args(argv)
+    if args.config:
+        # the config file sets the defaults, the command line overrides them
+        with open(args.config) as f:
+            subparsers[args.command].set_defaults(**json.load(f))
+        args = parser.parse_args(argv)
+    args.run(args)
+
+
+if __name__ == "__main__":
+    main()
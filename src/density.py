@@ -0,0 +1,103 @@
+import numpy as np
+
+from dynamics import normalize_observables, normalize_vector_angle, observable_scale
+
+
+class DensityImage:
+    """
+    Number of points per pixel over extent (x_min, x_max, y_min, y_max), on a grid
+    of size (width, height) pixels. Points are binned as they stream in (add), so
+    the memory is that of the image however many points are drawn; draw shows the
+    counts with imshow, on a log or histogram-equalized scale, so the dense regions
+    of a section do not saturate as overlapping markers do.
+    """
+
+    # points binned at a time, which bounds the temporary arrays of add
+    chunk_size = 1 << 20
+
+    def __init__(self, extent=(-1.2, 1.2, -1.2, 1.2), size=(1024, 1024)):
+        self.extent = tuple(float(value) for value in extent)
+        self.width, self.height = size
+        self.counts = np.zeros((self.height, self.width), dtype=np.int64)
+        self.n_points = 0
+
+    @classmethod
+    def for_axes(cls, ax, dpi):
+        # an image with one bin per pixel of ax saved at dpi, over its current limits
+        fig = ax.get_figure()
+        position = ax.get_position()
+        size = (
+            max(int(round(position.width * fig.get_figwidth() * dpi)), 1),
+            max(int(round(position.height * fig.get_figheight() * dpi)), 1),
+        )
+        return cls(ax.get_xlim() + ax.get_ylim(), size)
+
+    def add(self, x, y):
+        # bins the points (x, y); the points outside the extent (or NaN) are dropped
+        x, y = np.asarray(x, dtype=float), np.asarray(y, dtype=float)
+        x_min, x_max, y_min, y_max = self.extent
+        x_scale = self.width / (x_max - x_min)
+        y_scale = self.height / (y_max - y_min)
+        flat_counts = self.counts.reshape(-1)
+        for start in range(0, len(x), self.chunk_size):
+            ix = np.floor((x[start : start + self.chunk_size] - x_min) * x_scale)
+            iy = np.floor((y[start : start + self.chunk_size] - y_min) * y_scale)
+            inside = (ix >= 0) & (ix < self.width) & (iy >= 0) & (iy < self.height)
+            pixels = iy[inside].astype(np.int64) * self.width + ix[inside].astype(
+                np.int64
+            )
+            if len(pixels) > flat_counts.size // 16:
+                flat_counts += np.bincount(pixels, minlength=flat_counts.size)
+            else:
+                np.add.at(flat_counts, pixels, 1)
+            self.n_points += len(pixels)
+
+    def add_section(self, chunks, i1, i2):
+        """
+        Bins the points (i1, i2) of a section read as (7, n) chunks, the angles
+        wrapped and the points normalized as normalize_observables normalizes the
+        whole section. chunks is a function returning an iterator over them (e.g.
+        SectionStore.chunks), called twice: once for the scale, once to bin the
+        chunks one at a time.
+        """
+        scale = np.zeros(4)
+        for chunk in chunks():
+            scale = np.maximum(scale, observable_scale(chunk))
+        for chunk in chunks():
+            chunk = np.array(chunk, dtype=float)
+            chunk[:2] = normalize_vector_angle(chunk[:2])
+            points = normalize_observables(chunk, scale)
+            self.add(points[i1], points[i2])
+
+    def image(self, norm="log"):
+        """
+        The counts scaled for display, masked where there are no points:
+        norm="log": log(1 + counts), "equalize": the fraction of the occupied
+        pixels with at most as many points (histogram equalization), "linear".
+        """
+        occupied = self.counts > 0
+        if norm == "log":
+            values = np.log1p(self.counts)
+        elif norm == "equalize":
+            _, inverse, frequency = np.unique(
+                self.counts[occupied], return_inverse=True, return_counts=True
+            )
+            values = np.zeros(self.counts.shape)
+            values[occupied] = (np.cumsum(frequency) / occupied.sum())[inverse]
+        elif norm == "linear":
+            values = self.counts.astype(float)
+        else:
+            raise ValueError(f"Unknown norm: {norm}")
+        return np.ma.masked_where(~occupied, values)
+
+    def draw(self, ax, norm="log", cmap="magma", **style):
+        # the image of the counts on ax (keeping its limits and aspect); returns it
+        return ax.imshow(
+            self.image(norm),
+            origin="lower",
+            extent=self.extent,
+            interpolation="nearest",
+            aspect="auto",
+            cmap=cmap,
+            **style,
+        )
@@ -0,0 +1,1172 @@
+import numpy as np
+from scipy.integrate import solve_ivp
+from scipy.optimize import brentq
+from tqdm import tqdm
+import time
+
+try:
+    # private scipy classes, for the per-step interpolants of dense_output_coefficients
+    from scipy.integrate._ivp.rk import RkDenseOutput, Dop853DenseOutput
+    from scipy.integrate._ivp.radau import RadauDenseOutput
+except ImportError:
+    RkDenseOutput = Dop853DenseOutput = RadauDenseOutput = None
+
+from symplectic import METHODS as SYMPLECTIC_METHODS
+from symplectic import integrate_symplectic, symplectic_step
+from section_store import SectionStore
+from profiling import RunProfile
+from fractal import BoxCounter
+
+# Constants
+g = 10  # m/s^2 (for simplicity g = 10)
+m1, m2 = 1.0, 1.0  # kg
+L1, L2 = 1.0, 1.0  # m
+
+
+class PendulumParameters:
+    """
+    The physical constants of one double pendulum, with the coefficients of the
+    equations of motion and of the observables precomputed once.
+    Every function of this module takes such a parameter set (parameters=...),
+    the constants above by default, so one process can simulate many systems.
+    """
+
+    def __init__(self, g=g, m1=m1, m2=m2, L1=L1, L2=L2):
+        self.g, self.m1, self.m2, self.L1, self.L2 = g, m1, m2, L1, L2
+        # Lagrange equations
+        self.a = L2 / L1 * m2 / (m1 + m2)
+        self.b = L1 / L2
+        self.g_L1 = g / L1
+        self.g_L2 = g / L2
+        # momenta and energy: p1 = I1 omega1 + I12 omega2 cos(q1 - q2), ...
+        self.I1 = (m1 + m2) * L1 * L1
+        self.I2 = m2 * L2 * L2
+        self.I12 = m2 * L1 * L2
+        self.V1 = (m1 + m2) * g * L1
+        self.V2 = m2 * L2 * g
+
+    @classmethod
+    def from_ratios(cls, mass_ratio, length_ratio, g=g, m1=m1, L1=L1):
+        # the system with m2 = mass_ratio * m1 and L2 = length_ratio * L1
+        return cls(g, m1, mass_ratio * m1, L1, length_ratio * L1)
+
+    def as_dict(self):
+        return dict(g=self.g, m1=self.m1, m2=self.m2, L1=self.L1, L2=self.L2)
+
+    def __repr__(self):
+        values = ", ".join(
+            f"{name}={value:g}" for name, value in self.as_dict().items()
+        )
+        return f"PendulumParameters({values})"
+
+
+DEFAULT_PARAMETERS = PendulumParameters()
+
+
+# Lagrange equations (the differential equations equivalent to the Newton's equations)
+# y can also be a (4, N) array of states; the derivatives are then returned as (4, N)
+def lagrange_equations(t, y, parameters=DEFAULT_PARAMETERS):
+    q1, q2, omega1, omega2 = y
+    P = parameters
+
+    q1_dot = omega1
+    q2_dot = omega2
+
+    c_12 = P.a * np.cos(q1 - q2)
+    c_21 = P.b * np.cos(q1 - q2)
+    C1 = -P.a * omega2 * omega2 * np.sin(q1 - q2) - P.g_L1 * np.sin(q1)
+    C2 = P.b * omega1 * omega1 * np.sin(q1 - q2) - P.g_L2 * np.sin(q2)
+
+    omega1_dot = (C1 - c_12 * C2) / (1 - c_12 * c_21)
+    omega2_dot = (C2 - c_21 * C1) / (1 - c_12 * c_21)
+
+    return np.array([q1_dot, q2_dot, omega1_dot, omega2_dot])
+
+
+# Jacobian d(lagrange_equations)/dy, as a (4, 4) array (or (4, 4, N) for (4, N) states)
+def lagrange_jacobian(t, y, parameters=DEFAULT_PARAMETERS):
+    q1, q2, omega1, omega2 = y
+
+    a, b, g_L1, g_L2 = parameters.a, parameters.b, parameters.g_L1, parameters.g_L2
+    c, s = np.cos(q1 - q2), np.sin(q1 - q2)
+
+    C1 = -a * omega2 * omega2 * s - g_L1 * np.sin(q1)
+    C2 = b * omega1 * omega1 * s - g_L2 * np.sin(q2)
+    den = 1 - a * b * c * c
+    omega1_dot = (C1 - a * c * C2) / den
+    omega2_dot = (C2 - b * c * C1) / den
+
+    # derivatives of C1, C2 and den with respect to q1, q2, omega1, omega2
+    zero = np.zeros_like(c)
+    dC1 = [
+        -a * omega2 * omega2 * c - g_L1 * np.cos(q1),
+        a * omega2 * omega2 * c,
+        zero,
+        -2 * a * omega2 * s,
+    ]
+    dC2 = [
+        b * omega1 * omega1 * c,
+        -b * omega1 * omega1 * c - g_L2 * np.cos(q2),
+        2 * b * omega1 * s,
+        zero,
+    ]
+    dden = [2 * a * b * c * s, -2 * a * b * c * s, zero, zero]
+    # derivatives of c = cos(q1 - q2)
+    dc = [-s, s, zero, zero]
+
+    J = np.zeros((4, 4) + np.shape(c))
+    J[0, 2] = 1
+    J[1, 3] = 1
+    for j in range(4):
+        J[2, j] = (dC1[j] - a * (dc[j] * C2 + c * dC2[j]) - omega1_dot * dden[j]) / den
+        J[3, j] = (dC2[j] - b * (dc[j] * C1 + c * dC1[j]) - omega2_dot * dden[j]) / den
+    return J
+
+
+# Hamilton equations in the canonical variables z = (q1, q2, p1, p2)
+# z can also be a (4, N) array of states
+def hamilton_equations(t, z, parameters=DEFAULT_PARAMETERS):
+    q1, q2, p1, p2 = z
+    g, m1, m2, L1, L2 = (
+        parameters.g,
+        parameters.m1,
+        parameters.m2,
+        parameters.L1,
+        parameters.L2,
+    )
+
+    s, c = np.sin(q1 - q2), np.cos(q1 - q2)
+    den = m1 + m2 * s * s
+
+    q1_dot = (L2 * p1 - L1 * c * p2) / (L1 * L1 * L2 * den)
+    q2_dot = ((m1 + m2) * L1 * p2 - m2 * L2 * c * p1) / (m2 * L1 * L2 * L2 * den)
+
+    A1 = p1 * p2 * s / (L1 * L2 * den)
+    A2 = (
+        (
+            m2 * L2 * L2 * p1 * p1
+            + (m1 + m2) * L1 * L1 * p2 * p2
+            - 2 * m2 * L1 * L2 * p1 * p2 * c
+        )
+        * s
+        * c
+        / (L1 * L1 * L2 * L2 * den * den)
+    )
+    p1_dot = -(m1 + m2) * g * L1 * np.sin(q1) - A1 + A2
+    p2_dot = -m2 * g * L2 * np.sin(q2) + A1 - A2
+
+    return np.array([q1_dot, q2_dot, p1_dot, p2_dot])
+
+
+def to_canonical(y, parameters=DEFAULT_PARAMETERS):
+    # (q1, q2, omega1, omega2) -> (q1, q2, p1, p2)
+    q1, q2, omega1, omega2, p1, p2, E = compute_observables(y, parameters)
+    return np.array([q1, q2, p1, p2])
+
+
+def from_canonical(z, parameters=DEFAULT_PARAMETERS):
+    # (q1, q2, p1, p2) -> (q1, q2, omega1, omega2)
+    q1, q2, p1, p2 = z
+    return np.array([q1, q2] + list(hamilton_equations(0, z, parameters)[0:2]))
+
+
+# Initial conditions are fixed in terms of the total energy
+
+
+def find_initial_conditions(DeltaE, parameters=DEFAULT_PARAMETERS):
+    g, m1, m2, L1, L2 = (
+        parameters.g,
+        parameters.m1,
+        parameters.m2,
+        parameters.L1,
+        parameters.L2,
+    )
+
+    if DeltaE < 0:
+        print("DeltaE must be positive")
+        return [0.0, 0.0, 0.0, 0.0]
+    elif DeltaE < 2 * m2 * g * L2:
+        print("The lower pendulum is tilted at the initial moment")
+        q2_0 = np.acos(1 - DeltaE / (m2 * g * L2))
+        return [0.0, q2_0, 0.0, 0.0]
+    elif DeltaE < 2 * (m1 + m2) * g * L1 + 2 * m2 * g * L2:
+        print(
+            "The lower pendulum is in the vertical position (q2_0=pi); the upper pendulum is tilted at the initial moment"
+        )
+        q2_0 = np.pi
+        q1_0 = np.acos((2 * m2 * g * L2 - DeltaE) / (2 * (m1 + m2) * g * L1))
+        return [q1_0, q2_0, 0.0, 0.0]
+    else:
+        print(
+            "Both pendulums are in the vertical position (q1_0=q2_0=pi) and the pendulum 2 has an angular velocity"
+        )
+        q1_0 = np.pi
+        q2_0 = np.pi
+        omega2_0 = np.sqrt(
+            2 * (DeltaE - (2 * (m1 + m2) * g * L1 + 2 * m2 * g * L2)) / (m2 * L2**2)
+        )
+        return [q1_0, q2_0, 0.0, omega2_0]
+
+
+def cache_parameters(parameters=DEFAULT_PARAMETERS, **params):
+    # everything that determines a result: the physical constants and the given parameters
+    params.update(parameters.as_dict())
+    if params.get("method") not in SYMPLECTIC_METHODS:
+        params.pop("dt", None)  # the adaptive methods do not use dt
+    return params
+
+
+def integrate_trajectory(
+    y0,
+    t_span,
+    t_eval=None,
+    method="DOP853",
+    rtol=1e-10,
+    atol=1e-10,
+    dt=0.01,
+    cache=None,
+    profile=None,
+    parameters=DEFAULT_PARAMETERS,
+):
+    """
+    Integrates the double pendulum from the state y0 = (q1, q2, omega1, omega2).
+    method: any solve_ivp method (adaptive, controlled by rtol/atol), or one of the
+    symplectic methods (implicit_midpoint, gauss4, gauss6, yoshida4) which take fixed
+    steps dt in the canonical variables and keep the energy error bounded.
+    cache: optional TrajectoryCache; a trajectory integrated before with the same
+    parameters is loaded (memory-mapped) instead of integrated again.
+    profile: optional RunProfile recording the solver statistics, the integration
+    time and the energy drift.
+    parameters: the PendulumParameters of the system.
+    Returns (t, y) with y of shape (4, len(t)).
+    """
+    if profile is None:
+        profile = RunProfile()
+    if cache is not None:
+        params = cache_parameters(
+            parameters,
+            kind="trajectory",
+            y0=y0,
+            t_span=t_span,
+            t_eval=t_eval,
+            method=method,
+            rtol=rtol,
+            atol=atol,
+            dt=dt,
+        )
+        with profile.timer("cache_load"):
+            ty = cache.load(params)
+        if ty is None:
+            t, y = integrate_trajectory(
+                y0,
+                t_span,
+                t_eval,
+                method,
+                rtol,
+                atol,
+                dt,
+                profile=profile,
+                parameters=parameters,
+            )
+            ty = cache.store(params, np.vstack((t, y)))
+        return ty[0], ty[1:]
+
+    if method in SYMPLECTIC_METHODS:
+        with profile.timer("integration"):
+            t, z = integrate_symplectic(
+                profile.counted(lambda t, z: hamilton_equations(t, z, parameters)),
+                t_span,
+                to_canonical(y0, parameters),
+                t_eval,
+                method=method,
+                dt=dt,
+            )
+        y = from_canonical(z, parameters)
+    else:
+        with profile.timer("integration"):
+            sol = solve_ivp(
+                profile.counted(lambda t, y: lagrange_equations(t, y, parameters)),
+                t_span,
+                y0,
+                t_eval=t_eval,
+                method=profile.counted_solver(method),
+                rtol=rtol,
+                atol=atol,
+            )
+        profile.add_solver_stats(sol)
+        t, y = sol.t, sol.y
+    profile.record_energy(compute_observables(y, parameters)[6])
+    return t, y
+
+
+def dense_output_coefficients(interpolants):
+    """
+    The per-step interpolants of a solve_ivp dense output (sol.sol.interpolants)
+    as one (n_steps, m, 4) array c, the state over a step being
+    y_old + sum_j c[j] x^(j + 1) with x the fraction of the step.
+    The nested form of the DOP853 interpolant is expanded in powers of x.
+    This reads scipy internals (the private DenseOutput classes and their F, Q
+    and h); the coefficients are checked against the interpolant of the first
+    step, and if the internals are missing or changed, or for the methods whose
+    interpolants are of another form (BDF, LSODA), None is returned.
+    """
+    first = interpolants[0]
+    try:
+        if Dop853DenseOutput is not None and isinstance(first, Dop853DenseOutput):
+            # y - y_old = (...((F6 x + F5)(1 - x) + F4) x ...) x, expanded from F6 outwards
+            F = np.array([interpolant.F for interpolant in interpolants])
+            c = np.zeros((len(F), F.shape[1] + 1, F.shape[2]))
+            for i in range(F.shape[1]):
+                c[:, 0] += F[:, -1 - i]
+                shifted = np.zeros_like(c)
+                shifted[:, 1:] = c[:, :-1]
+                c = shifted if i % 2 == 0 else c - shifted
+            c = c[:, 1:]
+        elif RkDenseOutput is not None and isinstance(first, RkDenseOutput):
+            c = np.array([i.h * i.Q.T for i in interpolants])
+        elif RadauDenseOutput is not None and isinstance(first, RadauDenseOutput):
+            c = np.array([i.Q.T for i in interpolants])
+        else:
+            return None
+    except AttributeError:
+        return None
+
+    # the middle of the first step, from the coefficients and from the interpolant
+    x = 0.5 ** np.arange(1, c.shape[1] + 1)
+    y_mid = first(first.t_old) + x @ c[0]
+    if not np.allclose(y_mid, first(0.5 * (first.t_old + first.t)), rtol=1e-9):
+        return None
+    return c
+
+
+def integrate_dense_output(
+    y0,
+    t_span,
+    method="DOP853",
+    rtol=1e-10,
+    atol=1e-10,
+    dt=0.01,
+    cache=None,
+    profile=None,
+    parameters=DEFAULT_PARAMETERS,
+):
+    """
+    integrate_trajectory at the solver steps, keeping the solver's own interpolant
+    of every step (see dense_output_coefficients), so the solve can be evaluated
+    at any time exactly as solve_ivp evaluates t_eval.
+    The symplectic methods (and BDF, LSODA) have no such interpolants; for them
+    the coefficients are None.
+    With a cache, the steps and the coefficients are cached as one entry.
+    Returns (t, y, coefficients): y of shape (4, n), coefficients (n - 1, m, 4).
+    """
+    if profile is None:
+        profile = RunProfile()
+    if method in SYMPLECTIC_METHODS:
+        t, y = integrate_trajectory(
+            y0,
+            t_span,
+            None,
+            method,
+            rtol,
+            atol,
+            dt,
+            cache=cache,
+            profile=profile,
+            parameters=parameters,
+        )
+        return t, y, None
+    if cache is not None:
+        params = cache_parameters(
+            parameters,
+            kind="dense_output",
+            y0=y0,
+            t_span=t_span,
+            method=method,
+            rtol=rtol,
+            atol=atol,
+        )
+        with profile.timer("cache_load"):
+            steps = cache.load(params)
+        if steps is None:
+            t, y, coefficients = integrate_dense_output(
+                y0,
+                t_span,
+                method,
+                rtol,
+                atol,
+                dt,
+                profile=profile,
+                parameters=parameters,
+            )
+            # one row per step: t, y and the coefficients of the step that follows it
+            steps = np.zeros(
+                (len(t), 5 + (0 if coefficients is None else coefficients[0].size))
+            )
+            steps[:, 0], steps[:, 1:5] = t, y.T
+            if coefficients is not None:
+                steps[:-1, 5:] = coefficients.reshape(len(t) - 1, -1)
+            steps = cache.store(params, steps)
+        coefficients = None
+        if steps.shape[1] > 5:
+            coefficients = steps[:-1, 5:].reshape(len(steps) - 1, -1, 4)
+        return steps[:, 0], steps[:, 1:5].T, coefficients
+
+    with profile.timer("integration"):
+        sol = solve_ivp(
+            profile.counted(lambda t, y: lagrange_equations(t, y, parameters)),
+            t_span,
+            y0,
+            method=profile.counted_solver(method),
+            rtol=rtol,
+            atol=atol,
+            dense_output=True,
+        )
+    profile.add_solver_stats(sol)
+    profile.record_energy(compute_observables(sol.y, parameters)[6])
+    return sol.t, sol.y, dense_output_coefficients(sol.sol.interpolants)
+
+
+def rest_initial_conditions(DeltaE, n, parameters=DEFAULT_PARAMETERS):
+    """
+    n initial conditions with the energy DeltaE (above the stable equilibrium),
+    released from rest with the potential energy split in different proportions
+    between the two arms; the energy the arms cannot hold at rest goes into omega2.
+    Returns a (4, n) array.
+    """
+    P = parameters
+    E1_max = 2 * P.V1
+    E2_max = 2 * P.V2
+
+    E1 = np.arange(1, n + 1) / (n + 1) * min(DeltaE, E1_max)
+    E2 = np.minimum(DeltaE - E1, E2_max)
+    E_kinetic = DeltaE - E1 - E2
+
+    q1_0 = np.arccos(np.clip(1 - E1 / P.V1, -1, 1))
+    q2_0 = np.arccos(np.clip(1 - E2 / P.V2, -1, 1))
+    omega2_0 = np.sqrt(2 * E_kinetic / P.I2)
+    return np.array([q1_0, q2_0, np.zeros(n), omega2_0])
+
+
+def shell_initial_conditions(
+    DeltaE,
+    n,
+    i_section=1,
+    sampling="stratified",
+    direction=1,
+    seed=0,
+    parameters=DEFAULT_PARAMETERS,
+):
+    """
+    n initial conditions with the energy DeltaE (above the stable equilibrium),
+    spread over the Poincare section of the angle i_section (0: q1 = 0, 1: q2 = 0).
+    On the section, the other arm's (q, p) plane is sampled uniformly in area over
+    the region the energy allows, |p| <= sqrt(2 I (DeltaE - V (1 - cos q))), and
+    the remaining momentum is the root of the quadratic H = E that crosses the
+    section in the given direction (+1: the angle increasing).
+    sampling: "grid" (the centers of n cells of a square lattice), "stratified"
+    (one random point in each of these cells) or "random" (uniform, seeded).
+    The unit square is mapped onto the region by an area preserving map, so all
+    three are uniform in area. The energy of every state is checked against
+    DeltaE to rounding error.
+    Returns a (4, n) array of states (q1, q2, omega1, omega2).
+    """
+    I_a, V_a = section_plane(i_section, parameters)
+    if DeltaE <= 0:
+        raise ValueError("DeltaE must be positive")
+
+    # points of the unit square
+    rng = np.random.default_rng(seed)
+    if sampling == "random":
+        u, v = rng.random(n), rng.random(n)
+    elif sampling in ("grid", "stratified"):
+        k = int(np.ceil(np.sqrt(n)))
+        cells = np.round(np.linspace(0, k * k - 1, n)).astype(int)
+        offset = np.full((2, n), 0.5) if sampling == "grid" else rng.random((2, n))
+        u = (cells // k + offset[0]) / k
+        v = (cells % k + offset[1]) / k
+    else:
+        raise ValueError(f"Unknown sampling: {sampling}")
+
+    # u -> q by the cumulative area of the region, v -> p across its width
+    q_max = np.arccos(np.clip(1 - DeltaE / V_a, -1, 1))
+    q_grid = np.linspace(-q_max, q_max, 4097)
+    width = np.sqrt(np.maximum(DeltaE - V_a * (1 - np.cos(q_grid)), 0))
+    area = np.concatenate(([0], np.cumsum((width[1:] + width[:-1]) / 2)))
+    q = np.interp(u, area / area[-1], q_grid)
+    K = np.maximum(DeltaE - V_a * (1 - np.cos(q)), 0)  # kinetic energy
+    p = (2 * v - 1) * np.sqrt(2 * I_a * K)
+    return section_states(DeltaE, q, p, i_section, direction, parameters)
+
+
+def section_plane(i_section, parameters=DEFAULT_PARAMETERS):
+    # (I, V) of the arm whose (q, p) plane is left on the section of angle i_section
+    if i_section == 1:  # the (q1, p1) plane, q2 = 0
+        return parameters.I1, parameters.V1
+    if i_section == 0:  # the (q2, p2) plane, q1 = 0
+        return parameters.I2, parameters.V2
+    raise ValueError("The section must be that of an angle (i_section 0 or 1)")
+
+
+def section_states(
+    DeltaE, q, p, i_section=1, direction=1, parameters=DEFAULT_PARAMETERS
+):
+    """
+    The states with the energy DeltaE on the Poincare section of the angle
+    i_section (0: q1 = 0, 1: q2 = 0) whose other arm is at the points (q, p) of
+    its plane, crossing the section in the given direction (+1: the angle
+    increasing). Raises ValueError if a point is outside the region the energy
+    allows, p^2 <= 2 I (DeltaE - V (1 - cos q)).
+    Returns a (4, n) array of states (q1, q2, omega1, omega2).
+    """
+    P = parameters
+    I_a, V_a = section_plane(i_section, parameters)
+    q, p_a = np.atleast_1d(np.asarray(q, dtype=float), np.asarray(p, dtype=float))
+    K = np.maximum(DeltaE - V_a * (1 - np.cos(q)), 0)  # kinetic energy
+    if np.any(p_a * p_a > 2 * I_a * K * (1 + 1e-12) + 1e-300):
+        raise ValueError("The points are outside the energy shell")
+
+    # 2 det T = I_a p_b^2 - 2 I12 c p_a p_b + I_b p_a^2 = 2 det K, with c = cos(q);
+    # the sign of the root is the sign of the other angle's velocity
+    c = np.cos(q)
+    det = P.I1 * P.I2 - P.I12 * P.I12 * c * c
+    root = np.sqrt(np.maximum(det * (2 * I_a * K - p_a * p_a), 0))
+    p_b = (P.I12 * c * p_a + np.sign(direction) * root) / I_a
+
+    zero = np.zeros(len(q))
+    if i_section == 1:
+        z = np.array([q, zero, p_a, p_b])
+    else:
+        z = np.array([zero, q, p_b, p_a])
+    y = from_canonical(z, parameters)
+
+    energy = compute_observables(y, parameters)[6] + P.V1 + P.V2
+    error = np.max(np.abs(energy - DeltaE)) if len(q) else 0.0
+    if error > 1e-12 * max(DeltaE, P.V1 + P.V2):
+        raise RuntimeError(f"The section states missed the energy by {error:g}")
+    return y
+
+
+def normalize_vector_angle(angle):
+    normalized_angle = np.fmod(angle, 2 * np.pi)
+    normalized_angle = np.where(
+        normalized_angle > np.pi, normalized_angle - 2 * np.pi, normalized_angle
+    )
+    normalized_angle = np.where(
+        normalized_angle < -np.pi, normalized_angle + 2 * np.pi, normalized_angle
+    )
+    return normalized_angle
+
+
+def normalize_angle(angle):
+    normalized_angle = np.fmod(angle, 2 * np.pi)
+    normalized_angle = (
+        normalized_angle - 2 * np.pi if normalized_angle > np.pi else normalized_angle
+    )
+    normalized_angle = (
+        normalized_angle + 2 * np.pi if normalized_angle < -np.pi else normalized_angle
+    )
+    return normalized_angle
+
+
+def compute_observables(y, parameters=DEFAULT_PARAMETERS):
+
+    q1, q2, omega1, omega2 = y
+    P = parameters
+    c = np.cos(q1 - q2)
+    p1 = P.I1 * omega1 + P.I12 * omega2 * c
+    p2 = P.I2 * omega2 + P.I12 * omega1 * c
+
+    T = (
+        P.I1 * omega1 * omega1
+        + P.I2 * omega2 * omega2
+        + 2 * P.I12 * omega1 * omega2 * c
+    ) / 2
+    V = -P.V1 * np.cos(q1) - P.V2 * np.cos(q2)
+
+    return [q1, q2, omega1, omega2, p1, p2, T + V]
+
+
+def energy_error(y0, y, parameters=DEFAULT_PARAMETERS):
+    # |E(y) - E(y0)| of the (4, N) states, evaluated in float64 whatever their
+    # dtype, relative to the depth V1 + V2 of the potential
+    E_0 = compute_observables(np.asarray(y0, dtype=float), parameters)[6]
+    E = compute_observables(np.asarray(y, dtype=float), parameters)[6]
+    return np.abs(E - E_0) / (parameters.V1 + parameters.V2)
+
+
+def observable_scale(Observables):
+    # the (4,) max |value| of the observables 2 to 5 (0 where there is none)
+    points = np.abs(np.asarray(Observables, dtype=float)[2:6])
+    return np.array(
+        [np.nanmax(row) if np.any(np.isfinite(row)) else 0.0 for row in points]
+    )
+
+
+def normalize_observables(Observables, scale=None):
+    """
+    The normalization of the plots: angles / pi, the observables 2 to 5 / scale,
+    by default their max |value| (see observable_scale); a section read in chunks
+    passes the scale of the whole section.
+    """
+    points = np.array(Observables, dtype=float)
+    points[:2] /= np.pi
+    if scale is None:
+        scale = observable_scale(points)
+    for i in range(2, 6):
+        if scale[i - 2] != 0:
+            points[i] /= scale[i - 2]
+    return points
+
+
+def interpolate_observables(observable_old, observable_new, i_section):
+    # linear interpolation of the observables to the zero of observable i_section
+    observable_old = np.asarray(observable_old, dtype=float)
+    observable_new = np.asarray(observable_new, dtype=float)
+    a_1 = observable_old[i_section]
+    a_2 = observable_new[i_section]
+
+    if a_1 * a_2 > 0 or a_1 == a_2:
+        raise ValueError("The section is not crossed")
+    slope = -a_1 / (a_2 - a_1)
+    observable = observable_old + slope * (observable_new - observable_old)
+    observable[:2] = normalize_vector_angle(observable[:2])
+    return observable
+
+
+def section_observable(y, i_section, parameters=DEFAULT_PARAMETERS):
+    """
+    The Poincare section is taken at the zeros of this (smooth) observable.
+    For the angles (i_section 0 or 1) it is sin(q / 2), which vanishes at every
+    q = 0 modulo 2 pi (and only there), so the crossings of a rotating arm are
+    all found on the unwrapped angle of the integration.
+    """
+    if i_section < 2:
+        return np.sin(y[i_section] / 2)
+    if i_section < 4:
+        return y[i_section]
+    return compute_observables(y, parameters)[i_section]
+
+
+def observable_derivatives(Observables, parameters=DEFAULT_PARAMETERS):
+    # time derivatives of the (7, ...) observables of compute_observables
+    Observables = np.asarray(Observables, dtype=float)
+    derivatives = np.zeros_like(Observables)  # the energy is conserved
+    derivatives[:4] = lagrange_equations(0, Observables[:4], parameters)
+    derivatives[4:6] = hamilton_equations(0, Observables[[0, 1, 4, 5]], parameters)[2:]
+    return derivatives
+
+
+def hermite_cubic(s, h, y_0, y_1, d_0, d_1):
+    # cubic Hermite interpolant at s in [0, 1] of a step of length h
+    s2 = s * s
+    s3 = s2 * s
+    return (
+        (2 * s3 - 3 * s2 + 1) * y_0
+        + (s3 - 2 * s2 + s) * h * d_0
+        + (3 * s2 - 2 * s3) * y_1
+        + (s3 - s2) * h * d_1
+    )
+
+
+def trajectory_crossings(
+    t, Observables, i_section, direction=0, parameters=DEFAULT_PARAMETERS
+):
+    """
+    All the crossings of the Poincare section (see section_observable) along a
+    sampled trajectory: t of shape (T,) and the (7, T) observables at those times
+    (e.g. at the solver steps, see Trajectory.section). The sign changes are found
+    over the whole array at once, the angles being unwrapped first so their jumps
+    from pi to -pi are not taken for crossings. Each crossing is then refined on
+    the cubic Hermite interpolant of the section observable over its step, built
+    from the derivatives given by the equations of motion, and the other
+    observables are interpolated at it in the same way.
+    direction: +1 (-1) keeps only the crossings where the section observable
+    increases (decreases), for an angle the crossings where the angle itself
+    increases (decreases), whatever multiple of 2 pi it passes; 0 keeps all.
+    Returns (t_cross, the (7, n) observables at the crossings, angles normalized).
+    """
+    t = np.asarray(t, dtype=float)
+    Observables = np.array(Observables, dtype=float)
+    if Observables.shape != (7, len(t)):
+        raise ValueError(f"Expected (7, {len(t)}) observables, got {Observables.shape}")
+    if i_section not in range(6):
+        raise ValueError(f"The section observable must be 0, ..., 5, not {i_section}")
+
+    Observables[:2] = np.unwrap(Observables[:2], axis=1)
+    derivatives = observable_derivatives(Observables, parameters)
+    value = section_observable(Observables[:4], i_section, parameters)
+    if i_section < 2:
+        q = Observables[i_section]
+        value_dot = 0.5 * np.cos(q / 2) * derivatives[i_section]
+    else:
+        value_dot = derivatives[i_section]
+
+    # as in section_crossings, a trajectory starting on the section does not cross it
+    crossed = value[:-1] * value[1:] < 0
+    if i_section >= 2 and direction > 0:
+        crossed &= value[1:] > value[:-1]
+    elif i_section >= 2 and direction < 0:
+        crossed &= value[1:] < value[:-1]
+    k = np.flatnonzero(crossed)
+    h = t[k + 1] - t[k]
+
+    # bisection on the interpolant, all the crossings at once
+    v_0, v_1, d_0, d_1 = value[k], value[k + 1], value_dot[k], value_dot[k + 1]
+    s_low, s_high = np.zeros(len(k)), np.ones(len(k))
+    negative_low = v_0 < 0
+    for _ in range(52):
+        s = (s_low + s_high) / 2
+        move_low = (hermite_cubic(s, h, v_0, v_1, d_0, d_1) < 0) == negative_low
+        s_low = np.where(move_low, s, s_low)
+        s_high = np.where(move_low, s_high, s)
+    s = (s_low + s_high) / 2
+
+    points = hermite_cubic(
+        s,
+        h,
+        Observables[:, k],
+        Observables[:, k + 1],
+        derivatives[:, k],
+        derivatives[:, k + 1],
+    )
+    t_cross = t[k] + s * h
+    if i_section < 2 and direction != 0:
+        # sin(q / 2) decreases where q increases through odd multiples of 2 pi, so
+        # the direction of an angle is that of its velocity at the crossing
+        keep = np.sign(points[2 + i_section]) == np.sign(direction)
+        t_cross, points = t_cross[keep], points[:, keep]
+    points[:2] = normalize_vector_angle(points[:2])
+    return t_cross, points
+
+
+def section_crossings(
+    y0,
+    i_section,
+    t_0=0.0,
+    t_bound=np.inf,
+    method="DOP853",
+    rtol=1e-10,
+    atol=1e-10,
+    dt=0.01,
+    state=None,
+    profile=None,
+    parameters=DEFAULT_PARAMETERS,
+):
+    """
+    Generator over the crossings of the Poincare section (observable i_section = 0).
+    A single integration with the solve_ivp method (DOP853 by default; ValueError
+    for an unknown one) is stepped continuously; when the observable changes sign
+    over a step, the crossing is located with brentq on the dense output of that
+    step, so the crossing states are accurate to the solver tolerance.
+    With a symplectic method (fixed steps dt) the crossing is located with brentq
+    on the length of a partial step taken from the start of the step.
+    Yields (t, y) at each crossing.
+    state: optional dict; before each yield its "t" and "y" are set to the integrator
+    state at the end of the current step, from which the integration can be restarted
+    without repeating the crossing.
+    profile: optional RunProfile; the time spent stepping and locating crossings,
+    the right-hand side calls and the accepted and rejected steps (see
+    RunProfile.counted_solver) are recorded in it when the generator finishes
+    (or is closed).
+    """
+    if state is None:
+        state = {}
+    if profile is None:
+        profile = RunProfile()
+    if method in SYMPLECTIC_METHODS:
+        yield from symplectic_section_crossings(
+            y0, i_section, t_0, t_bound, method, dt, state, profile, parameters
+        )
+        return
+
+    solver = profile.counted_solver(method)(
+        profile.counted(lambda t, y: lagrange_equations(t, y, parameters)),
+        t_0,
+        y0,
+        t_bound,
+        rtol=rtol,
+        atol=atol,
+    )
+    value_old = section_observable(solver.y, i_section, parameters)
+
+    crossings = 0
+    try:
+        while solver.status == "running":
+            with profile.timer("integration"):
+                message = solver.step()
+            if solver.status == "failed":
+                raise RuntimeError(message)
+            value_new = section_observable(solver.y, i_section, parameters)
+            if value_old * value_new < 0:
+                with profile.timer("crossing_detection"):
+                    dense = solver.dense_output()
+                    t_cross = brentq(
+                        lambda t: section_observable(dense(t), i_section, parameters),
+                        solver.t_old,
+                        solver.t,
+                        xtol=1e-14,
+                        rtol=4 * np.finfo(float).eps,
+                    )
+                    y_cross = dense(t_cross)
+                crossings += 1
+                state["t"], state["y"] = solver.t, solver.y.copy()
+                yield t_cross, y_cross
+            value_old = value_new
+    finally:
+        profile.add(nfev=solver.nfev, crossings=crossings)
+
+
+def symplectic_section_crossings(
+    y0, i_section, t_0, t_bound, method, dt, state, profile, parameters
+):
+    # section_crossings for the fixed-step symplectic methods
+    fun = profile.counted(lambda t, z: hamilton_equations(t, z, parameters))
+
+    def observable(z):
+        return section_observable(from_canonical(z, parameters), i_section, parameters)
+
+    def partial_step(tau):
+        return symplectic_step(fun, t, z, tau, method)
+
+    t, z = t_0, to_canonical(y0, parameters)
+    value_old = section_observable(y0, i_section, parameters)
+
+    steps = crossings = 0
+    try:
+        while t + dt <= t_bound:
+            with profile.timer("integration"):
+                z_new = symplectic_step(fun, t, z, dt, method)
+            steps += 1
+            value_new = observable(z_new)
+            if value_old * value_new < 0:
+                with profile.timer("crossing_detection"):
+                    tau = brentq(
+                        lambda tau: observable(partial_step(tau)),
+                        0,
+                        dt,
+                        xtol=1e-14,
+                        rtol=4 * np.finfo(float).eps,
+                    )
+                    y_cross = from_canonical(partial_step(tau), parameters)
+                crossings += 1
+                state["t"], state["y"] = t + dt, from_canonical(z_new, parameters)
+                yield t + tau, y_cross
+            value_old = value_new
+            t, z = t + dt, z_new
+    finally:
+        profile.add(accepted_steps=steps, crossings=crossings)
+
+
+def poincare_section(
+    y0,
+    Np,
+    i_section,
+    t_0=0.0,
+    t_bound=np.inf,
+    method="DOP853",
+    rtol=1e-10,
+    atol=1e-10,
+    dt=0.01,
+    progress=True,
+    cache=None,
+    store_folder=None,
+    chunk_size=1000,
+    checkpoint_seconds=60,
+    profile=None,
+    parameters=DEFAULT_PARAMETERS,
+):
+    """
+    Computes Np points of the Poincare section starting from the state y0.
+    Returns the (7, Np) array of observables at the crossings (angles normalized);
+    if t_bound is reached first, the missing points are NaN.
+    cache: optional TrajectoryCache holding sections computed before.
+    store_folder: optional folder of a SectionStore; the crossings then stream to
+    disk in chunks (of chunk_size points, or fewer every checkpoint_seconds) with
+    a checkpoint of the integrator, and a run interrupted before Np points resumes
+    from the last checkpoint.
+    profile: optional RunProfile (see section_crossings), which also records the
+    energy drift over the crossings.
+    parameters: the PendulumParameters of the system.
+    """
+    if profile is None:
+        profile = RunProfile()
+    if store_folder is not None:
+        params = cache_parameters(
+            parameters,
+            y0=[float(value) for value in y0],
+            i_section=i_section,
+            t_0=t_0,
+            method=method,
+            rtol=rtol,
+            atol=atol,
+            dt=dt,
+        )
+        store = SectionStore(store_folder, params)
+        if store.n_points < Np:
+            stream_section(
+                store,
+                y0,
+                Np,
+                i_section,
+                t_0,
+                t_bound,
+                method,
+                rtol,
+                atol,
+                dt,
+                progress,
+                chunk_size,
+                checkpoint_seconds,
+                profile,
+                parameters,
+            )
+        Observables = np.full((7, Np), np.nan)
+        points = store.load()[:, :Np]
+        Observables[:, : points.shape[1]] = points
+        profile.record_energy(Observables[6])
+        Observables[0] = normalize_vector_angle(Observables[0])
+        Observables[1] = normalize_vector_angle(Observables[1])
+        return Observables
+
+    if cache is not None:
+        params = cache_parameters(
+            parameters,
+            kind="poincare",
+            y0=y0,
+            Np=Np,
+            i_section=i_section,
+            t_0=t_0,
+            t_bound=t_bound,
+            method=method,
+            rtol=rtol,
+            atol=atol,
+            dt=dt,
+        )
+        with profile.timer("cache_load"):
+            Observables = cache.load(params)
+        if Observables is None:
+            Observables = poincare_section(
+                y0,
+                Np,
+                i_section,
+                t_0,
+                t_bound,
+                method,
+                rtol,
+                atol,
+                dt,
+                progress,
+                profile=profile,
+                parameters=parameters,
+            )
+            Observables = cache.store(params, Observables)
+        # a writable copy, the callers normalize it in place
+        return np.array(Observables)
+
+    Observables = np.full((7, Np), np.nan)
+
+    pbar = tqdm(total=Np, disable=not progress)
+    crossings = section_crossings(
+        y0,
+        i_section,
+        t_0=t_0,
+        t_bound=t_bound,
+        method=method,
+        rtol=rtol,
+        atol=atol,
+        dt=dt,
+        profile=profile,
+        parameters=parameters,
+    )
+    for n, (t, y) in zip(range(Np), crossings):
+        Observables[:, n] = compute_observables(y, parameters)
+        pbar.update(1)
+    crossings.close()
+    pbar.close()
+    profile.record_energy(Observables[6])
+
+    Observables[0] = normalize_vector_angle(Observables[0])
+    Observables[1] = normalize_vector_angle(Observables[1])
+    return Observables
+
+
+def observable_bounds(energy, parameters=DEFAULT_PARAMETERS):
+    """
+    Bounds of |q1|, |q2|, |omega1|, |omega2|, |p1|, |p2| over the energy shell
+    T + V = energy (the observable 6 of compute_observables): the kinetic energy is
+    at most K = energy - min V, which bounds each angle through its potential
+    energy and the velocities and momenta through the mass matrix.
+    """
+    P = parameters
+    K = max(energy + P.V1 + P.V2, 0.0)
+    q1 = np.arccos(np.clip(1 - K / P.V1, -1, 1))
+    q2 = np.arccos(np.clip(1 - K / P.V2, -1, 1))
+    # smallest determinant of the mass matrix, at cos(q1 - q2) = +-1
+    det = P.I1 * P.I2 - P.I12 * P.I12
+    omega1 = np.sqrt(2 * K * P.I2 / det)
+    omega2 = np.sqrt(2 * K * P.I1 / det)
+    p1 = np.sqrt(2 * K * P.I1)
+    p2 = np.sqrt(2 * K * P.I2)
+    return np.array([q1, q2, omega1, omega2, p1, p2])
+
+
+def adaptive_poincare_section(
+    y0,
+    i_section,
+    i1=0,
+    i2=4,
+    tolerance=0.01,
+    batch_size=1000,
+    min_points=2000,
+    max_points=10**6,
+    num_boxes=7,
+    t_0=0.0,
+    t_bound=np.inf,
+    method="DOP853",
+    rtol=1e-10,
+    atol=1e-10,
+    dt=0.01,
+    progress=True,
+    profile=None,
+    parameters=DEFAULT_PARAMETERS,
+):
+    """
+    Poincare section from the state y0 whose number of points is set by the
+    convergence of its box-counting dimension in the plane (i1, i2), instead of
+    a fixed Np. The crossings arrive in batches of batch_size; after each batch
+    the occupied boxes of every scale are updated (BoxCounter, on a fixed grid
+    spanning the energy shell, see observable_bounds) and the dimension is
+    estimated again. The section stops once the estimate differs by at most
+    tolerance from the one at half as many points (with at least min_points),
+    or at max_points (or t_bound).
+    Returns (Observables, estimates): the (7, n) observables at the crossings as
+    in poincare_section, and the (2, n_batches) array of the number of points and
+    the dimension estimate after each batch.
+    """
+    if profile is None:
+        profile = RunProfile()
+
+    # the plane normalized as in the plots (angles / pi), with fixed scales
+    bounds = observable_bounds(compute_observables(y0, parameters)[6], parameters)
+    scales = bounds.copy()
+    scales[:2] = np.pi
+    extent = bounds / scales
+    counter = BoxCounter(
+        (-extent[i1], extent[i1], -extent[i2], extent[i2]), num_boxes=num_boxes
+    )
+
+    batches, estimates, states = [], [], []
+
+    def add_batch():
+        Observables = np.array(compute_observables(np.array(states).T, parameters))
+        Observables[0] = normalize_vector_angle(Observables[0])
+        Observables[1] = normalize_vector_angle(Observables[1])
+        batches.append(Observables)
+        with profile.timer("box_counting"):
+            counter.add(Observables[:6] / scales[:, None], i1, i2)
+            estimates.append((counter.n_points, counter.dimension()))
+        pbar.update(len(states))
+        pbar.set_postfix(dimension=f"{estimates[-1][1]:.4f}")
+        states.clear()
+
+    def converged():
+        n_points, dimension = estimates[-1]
+        if n_points >= max_points:
+            return True
+        earlier = [estimate for n, estimate in estimates if n <= n_points // 2]
+        return (
+            n_points >= min_points
+            and len(earlier) > 0
+            and abs(dimension - earlier[-1]) <= tolerance
+        )
+
+    pbar = tqdm(total=max_points, disable=not progress)
+    crossings = section_crossings(
+        y0,
+        i_section,
+        t_0=t_0,
+        t_bound=t_bound,
+        method=method,
+        rtol=rtol,
+        atol=atol,
+        dt=dt,
+        profile=profile,
+        parameters=parameters,
+    )
+    for t, y in crossings:
+        states.append(y)
+        if len(states) == min(batch_size, max_points - counter.n_points):
+            add_batch()
+            if converged():
+                break
+    crossings.close()
+    if states:  # t_bound reached within a batch
+        add_batch()
+    pbar.close()
+
+    Observables = np.concatenate(batches, axis=1) if batches else np.zeros((7, 0))
+    profile.record_energy(Observables[6])
+    return Observables, np.array(estimates, dtype=float).reshape(-1, 2).T
+
+
+def stream_section(
+    store,
+    y0,
+    Np,
+    i_section,
+    t_0,
+    t_bound,
+    method,
+    rtol,
+    atol,
+    dt,
+    progress,
+    chunk_size,
+    checkpoint_seconds,
+    profile,
+    parameters,
+):
+    # appends crossings to the SectionStore until it holds Np points (or t_bound is reached)
+    if store.checkpoint is not None:
+        print(f"Resuming the Poincare section from {store.n_points} points")
+        t_0, y0 = store.checkpoint["t"], np.array(store.checkpoint["y"])
+
+    state = {}
+    crossings = section_crossings(
+        y0,
+        i_section,
+        t_0=t_0,
+        t_bound=t_bound,
+        method=method,
+        rtol=rtol,
+        atol=atol,
+        dt=dt,
+        state=state,
+        profile=profile,
+        parameters=parameters,
+    )
+
+    pbar = tqdm(total=Np, initial=store.n_points, disable=not progress)
+    buffer = []
+    last_checkpoint = time.time()
+    for t, y in crossings:
+        buffer.append(compute_observables(y, parameters))
+        pbar.update(1)
+        done = store.n_points + len(buffer) >= Np
+        if (
+            done
+            or len(buffer) >= chunk_size
+            or time.time() - last_checkpoint > checkpoint_seconds
+        ):
+            store.append(np.array(buffer).T, state["t"], state["y"])
+            buffer = []
+            last_checkpoint = time.time()
+        if done:
+            break
+    crossings.close()
+    if buffer:
+        store.append(np.array(buffer).T, state["t"], state["y"])
+    pbar.close()
+
+
+labels = ["q1", "q2", "omega1", "omega2", "p1", "p2"]
@@ -0,0 +1,252 @@
+import numpy as np
+from scipy.integrate import DOP853
+
+# Butcher tableau and error estimators of the Dormand-Prince 8(5,3) method,
+# the same scheme used by solve_ivp(method="DOP853")
+n_stages = DOP853.n_stages
+A = DOP853.A
+B = DOP853.B
+C = DOP853.C
+E3 = DOP853.E3
+E5 = DOP853.E5
+error_exponent = -1 / (DOP853.error_estimator_order + 1)
+
+SAFETY = 0.9
+MIN_FACTOR = 0.2
+MAX_FACTOR = 10
+
+
+def rms_norm(x):
+    # RMS norm of every column (trajectory) of x
+    return np.sqrt(np.mean(x * x, axis=0))
+
+
+def select_initial_step(fun, t, y, f, rtol, atol):
+    """
+    Initial step size of every trajectory (Hairer, Norsett & Wanner, II.4),
+    the same rule used by solve_ivp, evaluated for all columns of y at once.
+    """
+    scale = atol + np.abs(y) * rtol
+    d0 = rms_norm(y / scale)
+    d1 = rms_norm(f / scale)
+    h0 = np.where((d0 < 1e-5) | (d1 < 1e-5), 1e-6, 0.01 * d0 / np.maximum(d1, 1e-300))
+
+    f1 = fun(t + h0, y + h0 * f)
+    d2 = rms_norm((f1 - f) / scale) / h0
+    h1 = np.where(
+        (d1 <= 1e-15) & (d2 <= 1e-15),
+        np.maximum(1e-6, h0 * 1e-3),
+        (0.01 / np.maximum(np.maximum(d1, d2), 1e-300)) ** (1 / 8),
+    )
+    return np.minimum(100 * h0, h1)
+
+
+def rk_step(fun, t, y, f, h):
+    """
+    One DOP853 step of size h (one value per trajectory) for all columns of y.
+    Returns the new state, its derivative and the stage array K, all in the dtype
+    of y (the times stay in float64).
+    """
+    dtype = y.dtype
+    K = np.empty((n_stages + 1,) + y.shape, dtype=dtype)
+    K[0] = f
+    h_y = h.astype(dtype)
+    A_y = A.astype(dtype)
+    for s in range(1, n_stages):
+        dy = np.tensordot(A_y[s, :s], K[:s], axes=(0, 0)) * h_y
+        K[s] = fun(t + C[s] * h, y + dy)
+    y_new = y + h_y * np.tensordot(B.astype(dtype), K[:n_stages], axes=(0, 0))
+    f_new = fun(t + h, y_new).astype(dtype, copy=False)
+    K[-1] = f_new
+    return y_new, f_new, K
+
+
+def estimate_error_norm(K, h, scale):
+    # DOP853 error norm of every trajectory (mixed 5th and 3rd order estimators)
+    err5 = np.tensordot(E5.astype(K.dtype), K, axes=(0, 0)) / scale
+    err3 = np.tensordot(E3.astype(K.dtype), K, axes=(0, 0)) / scale
+    err5_norm_2 = np.sum(err5 * err5, axis=0)
+    err3_norm_2 = np.sum(err3 * err3, axis=0)
+    denom = err5_norm_2 + 0.01 * err3_norm_2
+    denom = np.where(denom == 0, 1.0, denom)
+    return np.abs(h) * err5_norm_2 / np.sqrt(denom * K.shape[1])
+
+
+def hermite_interpolate(s, h, y_0, f_0, y_1, f_1):
+    # cubic Hermite interpolant of a step of size h at the fractions s in [0, 1]
+    s2, s3 = s * s, s * s * s
+    return (
+        (2 * s3 - 3 * s2 + 1) * y_0
+        + (s3 - 2 * s2 + s) * h * f_0
+        + (3 * s2 - 2 * s3) * y_1
+        + (s3 - s2) * h * f_1
+    )
+
+
+def locate_stop(stop, t, h, y_0, f_0, y_1, f_1, g_0, g_1, n_iter=8):
+    """
+    Times at which stop(t, y) crosses zero within the steps [t, t + h], found by
+    regula falsi on the cubic Hermite interpolant of every step.
+    """
+    s_lo, s_hi = np.zeros_like(t), np.ones_like(t)
+    g_lo, g_hi = g_0, g_1
+    for _ in range(n_iter):
+        s = s_lo - g_lo * (s_hi - s_lo) / (g_hi - g_lo)
+        g_s = stop(t + s * h, hermite_interpolate(s, h, y_0, f_0, y_1, f_1))
+        below = g_s <= 0
+        s_lo, g_lo = np.where(below, s, s_lo), np.where(below, g_s, g_lo)
+        s_hi, g_hi = np.where(below, s_hi, s), np.where(below, g_hi, g_s)
+    return t + (s_lo - g_lo * (s_hi - s_lo) / (g_hi - g_lo)) * h
+
+
+def integrate_ensemble(
+    fun,
+    t_span,
+    y0,
+    t_eval=None,
+    rtol=1e-10,
+    atol=1e-10,
+    stop=None,
+    dtype=np.float64,
+    check=None,
+):
+    """
+    Integrates N initial conditions at once with a per-trajectory adaptive DOP853 scheme.
+
+    fun(t, y) must accept the state as a (d, N) array (and t as an (N,) array) and
+    return the (d, N) derivatives; lagrange_equations does.
+    y0: (d, N) array of initial conditions, one column per trajectory.
+    t_eval: optional increasing times in t_span at which the states are stored.
+    stop: optional function stop(t, y) -> (N,) values; a trajectory is retired
+    (and no longer integrated) as soon as its value becomes positive.
+
+    Returns the (d, N) final states if t_eval is None,
+    else the (d, N, len(t_eval)) states at t_eval.
+    With stop, returns (states, t_stop) instead: t_stop holds the stop times,
+    located on the interpolant of the last step (NaN for the trajectories that
+    were not stopped), and the states after a stop are NaN.
+
+    dtype=np.float32 integrates (and returns) the states in single precision, which
+    halves the memory of the state and stage arrays and their traffic; rtol is then
+    raised to at least 100 float32 epsilons (about 1e-5), enough for maps read as
+    pictures. check(y0, y) -> (N,) bool, evaluated on the float64 initial states and
+    the last states reached (at t_end or at the stop), flags the trajectories whose
+    single precision result is not to be trusted (e.g. from their energy_error);
+    these are integrated again in float64.
+    """
+    t_start, t_end = t_span
+    y0 = np.asarray(y0, dtype=float)
+    if y0.ndim != 2:
+        raise ValueError("y0 must be a (d, N) array")
+    dtype = np.dtype(dtype)
+    y = y0.astype(dtype)
+    d, N = y.shape
+    requested_rtol = rtol
+    rtol = max(rtol, 100 * np.finfo(dtype).eps)
+
+    if t_eval is None:
+        targets = np.array([t_end], dtype=float)
+    else:
+        targets = np.asarray(t_eval, dtype=float)
+        if np.any(np.diff(targets) < 0) or targets[0] < t_start or targets[-1] > t_end:
+            raise ValueError("t_eval must be increasing and within t_span")
+    y_out = np.full((d, N, len(targets)), np.nan, dtype=dtype)
+
+    t = np.full(N, float(t_start))
+    i_target = np.zeros(N, dtype=int)
+
+    # store the outputs requested at the initial time
+    at_start = targets == t_start
+    y_out[:, :, at_start] = y[:, :, None]
+    i_target[:] = np.count_nonzero(at_start)
+
+    t_stop = np.full(N, np.nan)
+    if stop is not None:
+        g = stop(t, y)
+        # trajectories that start beyond the stop condition are stopped at once
+        stopped = g > 0
+        t_stop[stopped] = t_start
+        i_target[stopped] = len(targets)
+
+    f = fun(t, y)
+    h = select_initial_step(fun, t, y, f, rtol, atol)
+
+    active = np.flatnonzero(i_target < len(targets))
+    while active.size:
+        t_a, y_a, f_a, h_a = t[active], y[:, active], f[:, active], h[active]
+        t_next = targets[i_target[active]]
+
+        # clip the step so that each trajectory lands exactly on its next output time
+        landing = h_a >= t_next - t_a
+        h_step = np.where(landing, t_next - t_a, h_a)
+        clipped = h_step < h_a
+        y_new, f_new, K = rk_step(fun, t_a, y_a, f_a, h_step)
+
+        scale = atol + np.maximum(np.abs(y_a), np.abs(y_new)) * rtol
+        error_norm = estimate_error_norm(K, h_step, scale)
+        accepted = error_norm < 1
+
+        with np.errstate(divide="ignore"):
+            factor = np.where(
+                error_norm == 0, MAX_FACTOR, SAFETY * error_norm**error_exponent
+            )
+        factor = np.where(
+            accepted, np.minimum(MAX_FACTOR, factor), np.maximum(MIN_FACTOR, factor)
+        )
+        h_new = h_step * factor
+        # a step shortened to hit an output time must not shrink the next one
+        h_new = np.where(accepted & clipped, np.maximum(h_new, h_a), h_new)
+        h[active] = h_new
+
+        if np.any(h_new < 10 * np.spacing(t_a)):
+            raise RuntimeError(
+                "Required step size is less than spacing between numbers."
+            )
+
+        acc = active[accepted]
+        t[acc] = np.where(landing, t_next, t_a + h_step)[accepted]
+        y[:, acc] = y_new[:, accepted]
+        f[:, acc] = f_new[:, accepted]
+
+        # record the trajectories that reached their next output time
+        reached = active[accepted & landing]
+        y_out[:, reached, i_target[reached]] = y[:, reached]
+        i_target[reached] += 1
+
+        if stop is not None:
+            g_new = stop(t[acc], y[:, acc])
+            stopped = g_new > 0
+            i_stop = acc[stopped]
+            if i_stop.size:
+                a_stop = np.flatnonzero(accepted)[stopped]
+                t_stop[i_stop] = locate_stop(
+                    stop,
+                    t_a[a_stop],
+                    h_step[a_stop],
+                    y_a[:, a_stop],
+                    f_a[:, a_stop],
+                    y_new[:, a_stop],
+                    f_new[:, a_stop],
+                    g[i_stop],
+                    g_new[stopped],
+                )
+            i_target[i_stop] = len(targets)
+            g[acc] = g_new
+
+        active = active[i_target[active] < len(targets)]
+
+    if check is not None and dtype != np.float64:
+        rerun = np.flatnonzero(check(y0, y))
+        if rerun.size:
+            result = integrate_ensemble(
+                fun, t_span, y0[:, rerun], t_eval, requested_rtol, atol, stop
+            )
+            if stop is not None:
+                result, t_stop[rerun] = result
+            y_out[:, rerun] = result.reshape(d, rerun.size, -1)
+
+    if t_eval is None:
+        y_out = y_out[:, :, 0]
+    if stop is not None:
+        return y_out, t_stop
+    return y_out
@@ -0,0 +1,254 @@
+import numpy as np
+import matplotlib.pyplot as plt
+from matplotlib import colormaps
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import Manager
+import queue
+import time
+
+from dynamics import (
+    DEFAULT_PARAMETERS,
+    compute_observables,
+    labels,
+    normalize_vector_angle,
+    section_crossings,
+    section_plane,
+    section_states,
+)
+
+
+def section_scale(DeltaE, i_section, parameters=DEFAULT_PARAMETERS):
+    # the largest momentum of the (q, p) plane on the energy shell, the p axis scale
+    I_a, _ = section_plane(i_section, parameters)
+    return np.sqrt(2 * I_a * DeltaE)
+
+
+def explore_orbit(
+    orbit,
+    y0,
+    i_section,
+    Np,
+    scale,
+    points_queue,
+    stop,
+    batch_size=100,
+    flush_seconds=0.2,
+    method="DOP853",
+    rtol=1e-10,
+    atol=1e-10,
+    dt=0.01,
+    parameters=DEFAULT_PARAMETERS,
+):
+    """
+    One orbit of the explorer (runs in a worker process): follows the crossings of
+    the section i_section from y0 with section_crossings and puts their (2, n)
+    normalized (q / pi, p / scale) points on points_queue as (orbit, points), in
+    batches of batch_size points or fewer every flush_seconds, then (orbit, None).
+    Stops after Np crossings, or at the first batch after the event stop is set.
+    """
+    i1, i2 = 1 - i_section, 5 - i_section
+
+    def normalized(states):
+        observables = compute_observables(np.array(states).T, parameters)
+        return np.array(
+            [
+                normalize_vector_angle(observables[i1]) / np.pi,
+                observables[i2] / scale,
+            ]
+        )
+
+    crossings = section_crossings(
+        y0,
+        i_section,
+        method=method,
+        rtol=rtol,
+        atol=atol,
+        dt=dt,
+        parameters=parameters,
+    )
+    buffer = []
+    last_flush = time.time()
+    for n, (t, y) in zip(range(Np), crossings):
+        buffer.append(y)
+        if len(buffer) >= batch_size or time.time() - last_flush > flush_seconds:
+            points_queue.put((orbit, normalized(buffer)))
+            buffer = []
+            last_flush = time.time()
+            if stop.is_set():
+                break
+    crossings.close()
+    if buffer:
+        points_queue.put((orbit, normalized(buffer)))
+    points_queue.put((orbit, None))
+    return orbit
+
+
+class PoincareExplorer:
+    """
+    Interactive Poincare section at the energy DeltaE: a click on the (q, p) plane
+    of the section i_section launches the orbit through that point (the state of
+    section_states, crossing in the increasing direction), integrated for Np
+    crossings on a process pool of workers (None: one per CPU). The workers put
+    their crossings on a queue in batches, and a timer of the figure drains it
+    every interval milliseconds and redraws, so the window never waits on an
+    integration. The boundary of the energy shell is drawn; clicks outside it, or
+    with the zoom or pan tools active, are ignored.
+    The solver arguments and parameters are as in section_crossings.
+    """
+
+    def __init__(
+        self,
+        DeltaE=12,
+        i_section=1,
+        Np=2000,
+        workers=None,
+        interval=100,
+        batch_size=100,
+        method="DOP853",
+        rtol=1e-10,
+        atol=1e-10,
+        dt=0.01,
+        parameters=DEFAULT_PARAMETERS,
+    ):
+        self.DeltaE, self.i_section, self.Np = DeltaE, i_section, Np
+        self.batch_size = batch_size
+        self.solver = dict(method=method, rtol=rtol, atol=atol, dt=dt)
+        self.parameters = parameters
+        self.scale = section_scale(DeltaE, i_section, parameters)
+
+        self.executor = ProcessPoolExecutor(max_workers=workers)
+        self.manager = Manager()
+        self.queue = self.manager.Queue()
+        self.stop = self.manager.Event()
+        self.colors = colormaps["tab10"].colors
+
+        # the orbits: their artists, collected points and whether they are running
+        self.lines = []
+        self.points = []
+        self.running = set()
+
+        i1, i2 = 1 - i_section, 5 - i_section
+        self.fig, self.ax = plt.subplots(figsize=(8, 8))
+        ax = self.ax
+        ax.set_xlim(-1.05, 1.05)
+        ax.set_ylim(-1.05, 1.05)
+        ax.set_xlabel(labels[i1] + " / pi")
+        ax.set_ylabel(labels[i2] + f" / {self.scale:.3g}")
+        ax.set_title(
+            "Double Pendulum Poincare explorer at zero "
+            + labels[i_section]
+            + f", DeltaE = {DeltaE:g}\nclick to launch an orbit"
+        )
+        ax.grid(True)
+        ax.plot(*self.shell_boundary(), color="k", lw=0.8)
+        self.status = ax.text(0.02, 0.97, "", transform=ax.transAxes, va="top")
+
+        self.fig.canvas.mpl_connect("button_press_event", self.on_click)
+        self.fig.canvas.mpl_connect("close_event", self.close)
+        self.timer = self.fig.canvas.new_timer(interval=interval)
+        self.timer.add_callback(self.poll)
+        self.timer.start()
+
+    def shell_boundary(self):
+        # the curve p^2 = 2 I K(q) bounding the energy shell, normalized as the plot
+        I_a, V_a = section_plane(self.i_section, self.parameters)
+        q_max = np.arccos(np.clip(1 - self.DeltaE / V_a, -1, 1))
+        q = np.linspace(-q_max, q_max, 513)
+        p = np.sqrt(2 * I_a * np.maximum(self.DeltaE - V_a * (1 - np.cos(q)), 0))
+        x = np.concatenate((q, q[::-1], q[:1])) / np.pi
+        y = np.concatenate((p, -p[::-1], p[:1])) / self.scale
+        return x, y
+
+    def launch(self, x, y):
+        """
+        Launches the orbit through the point (x, y) of the plot (q / pi, p / scale);
+        returns its number, or None if the point is outside the energy shell.
+        """
+        try:
+            y0 = section_states(
+                self.DeltaE,
+                x * np.pi,
+                y * self.scale,
+                self.i_section,
+                parameters=self.parameters,
+            )[:, 0]
+        except ValueError:
+            return None
+        orbit = len(self.lines)
+        (line,) = self.ax.plot(
+            [], [], ".", ms=1, color=self.colors[orbit % len(self.colors)]
+        )
+        self.lines.append(line)
+        self.points.append([])
+        self.running.add(orbit)
+        self.executor.submit(
+            explore_orbit,
+            orbit,
+            y0,
+            self.i_section,
+            self.Np,
+            self.scale,
+            self.queue,
+            self.stop,
+            self.batch_size,
+            parameters=self.parameters,
+            **self.solver,
+        )
+        self.update_status()
+        return orbit
+
+    def on_click(self, event):
+        toolbar = self.fig.canvas.toolbar
+        if event.inaxes is not self.ax or event.button != 1:
+            return
+        if toolbar is not None and toolbar.mode:
+            return
+        if self.launch(event.xdata, event.ydata) is None:
+            print(f"({event.xdata:.3f}, {event.ydata:.3f}) is outside the energy shell")
+
+    def poll(self):
+        # drains the queue into the artists of the orbits, then redraws once
+        changed = False
+        while True:
+            try:
+                orbit, points = self.queue.get_nowait()
+            except (queue.Empty, EOFError, OSError):
+                break
+            if points is None:
+                self.running.discard(orbit)
+            else:
+                self.points[orbit].append(points)
+                self.lines[orbit].set_data(*np.concatenate(self.points[orbit], axis=1))
+            changed = True
+        if changed:
+            self.update_status()
+            self.fig.canvas.draw_idle()
+
+    def update_status(self):
+        n_points = sum(
+            sum(batch.shape[1] for batch in batches) for batches in self.points
+        )
+        self.status.set_text(
+            f"{len(self.lines)} orbits ({len(self.running)} running), {n_points} points"
+        )
+
+    def close(self, event=None):
+        # stops the timer and the workers (the running orbits at their next batch)
+        if self.stop is None:
+            return
+        self.timer.stop()
+        self.stop.set()
+        self.executor.shutdown(wait=True, cancel_futures=True)
+        self.manager.shutdown()
+        self.stop = None
+
+
+def poincare_explorer(DeltaE=12, i_section=1, Np=2000, workers=None, **options):
+    """
+    Opens the interactive Poincare explorer (see PoincareExplorer, which takes the
+    other options) and blocks until its window is closed.
+    """
+    print("Double Pendulum Poincare explorer: click on the section to launch orbits")
+    explorer = PoincareExplorer(DeltaE, i_section, Np, workers, **options)
+    plt.show()
+    return explorer
@@ -0,0 +1,243 @@
+"""
+Headless export of the animations: the frames are rendered with Agg in worker
+processes, chunk by chunk, and streamed in order as raw RGB buffers into ffmpeg
+(or saved as PNG files into a frame directory).
+
+A scene draws one animation on a bare Figure. scene(fig, data, trail_length, fade)
+returns the functions reset() and advance(i0, i1): advance adds the source samples
+i0, ..., i1 - 1 to the drawing, which then shows the state at sample i1 - 1.
+"""
+
+import numpy as np
+from matplotlib.figure import Figure
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+from concurrent.futures import ProcessPoolExecutor
+from collections import deque
+from tqdm import tqdm
+import subprocess
+import shutil
+import os
+
+from trails import Trail
+
+
+def pendulum_scene(fig, data, trail_length=None, fade=False):
+    # data: (x1, y1, x2, y2) positions of the two bobs
+    x1, y1, x2, y2 = data
+    ax = fig.subplots()
+    ax.set_aspect("equal")
+    ax.set_xlim(-2.2, 2.2)
+    ax.set_ylim(-2.2, 2.2)
+    ax.set_xlabel("x")
+    ax.set_ylabel("y")
+    ax.set_title("Double Pendulum Animation (Lagrange equations)")
+    ax.grid(True)
+    (line,) = ax.plot([], [], "o-", lw=2)
+    trail = Trail(ax, len(x2), trail_length, fade, color="r", alpha=0.4, lw=1, ls="-")
+
+    def reset():
+        line.set_data([], [])
+        trail.clear()
+
+    def advance(i0, i1):
+        i = i1 - 1
+        line.set_data([0, x1[i], x2[i]], [0, y1[i], y2[i]])
+        trail.extend(x2[i0:i1], y2[i0:i1])
+
+    return reset, advance
+
+
+def trajectory_scene(fig, data, trail_length=None, fade=False):
+    # data: (x, y, xlabel, ylabel) normalized observables
+    x, y, xlabel, ylabel = data
+    ax = fig.subplots()
+    ax.set_aspect("equal")
+    ax.set_xlim(-1.2, 1.2)
+    ax.set_ylim(-1.2, 1.2)
+    ax.set_xlabel(xlabel)
+    ax.set_ylabel(ylabel)
+    ax.set_title("Double Pendulum trajectory (" + xlabel + ", " + ylabel + ")")
+    trail = Trail(ax, len(x), trail_length, fade, color="r", alpha=0.4, lw=1, ls="-")
+
+    def reset():
+        trail.clear()
+
+    def advance(i0, i1):
+        trail.extend(x[i0:i1], y[i0:i1])
+
+    return reset, advance
+
+
+def poincare_scene(fig, data, trail_length=None, fade=False):
+    # data: (x, y, xlabel, ylabel, title) normalized observables at the crossings
+    x, y, xlabel, ylabel, title = data
+    ax = fig.subplots()
+    ax.set_aspect("equal")
+    ax.set_xlim(-1.2, 1.2)
+    ax.set_ylim(-1.2, 1.2)
+    ax.set_xlabel(xlabel)
+    ax.set_ylabel(ylabel)
+    ax.set_title(title)
+    trail = Trail(ax, len(x), ls="", marker=",", color="r", alpha=0.2, markersize=0.05)
+    counter = ax.text(0.02, 0.97, "", transform=ax.transAxes, va="top")
+
+    def reset():
+        trail.clear()
+
+    def advance(i0, i1):
+        trail.extend(x[i0:i1], y[i0:i1])
+        counter.set_text("frame " + str(i1) + "/" + str(len(x)))
+
+    return reset, advance
+
+
+SCENES = {
+    "pendulum": pendulum_scene,
+    "trajectory": trajectory_scene,
+    "Poincare": poincare_scene,
+}
+
+# the figure of the worker process, set up once by init_export_worker
+worker_figure = None
+worker_scene = None
+
+
+def init_export_worker(scene, data, size, dpi, trail_length, fade):
+    global worker_figure, worker_scene
+    width, height = size
+    worker_figure = Figure(figsize=(width / dpi, height / dpi), dpi=dpi)
+    FigureCanvasAgg(worker_figure)
+    worker_scene = SCENES[scene](worker_figure, data, trail_length, fade)
+
+
+def render_chunk(indices, frame_folder=None, first_frame=0):
+    """
+    Renders the frames showing the source samples indices (increasing). The scene
+    is first advanced through all the samples before the chunk, so every chunk
+    draws the same trail as a sequential run would.
+    Returns the list of raw RGB buffers, or of the PNG files if frame_folder is set.
+    """
+    reset, advance = worker_scene
+    reset()
+    frames = []
+    previous = 0
+    for k, i in enumerate(indices):
+        advance(previous, i + 1)
+        previous = i + 1
+        worker_figure.canvas.draw()
+        if frame_folder is None:
+            rgba = np.asarray(worker_figure.canvas.buffer_rgba())
+            frames.append(np.ascontiguousarray(rgba[:, :, :3]).tobytes())
+        else:
+            filename = os.path.join(frame_folder, f"frame_{first_frame + k:06d}.png")
+            worker_figure.savefig(filename)
+            frames.append(filename)
+    return frames
+
+
+def frame_indices(n_samples, source_fps, fps):
+    # the source sample shown in each output frame, for playback at fps
+    n_frames = max(int(round(n_samples * fps / source_fps)), 1)
+    indices = np.round(np.arange(n_frames) * source_fps / fps).astype(int)
+    return np.minimum(indices, n_samples - 1)
+
+
+def export_animation(
+    scene,
+    data,
+    n_samples,
+    filename=None,
+    frame_folder=None,
+    source_fps=50,
+    fps=30,
+    size=(1280, 720),
+    dpi=100,
+    trail_length=None,
+    fade=False,
+    workers=None,
+    chunk_size=64,
+):
+    """
+    Renders the animation scene (a key of SCENES) of n_samples source samples into
+    the video filename (through ffmpeg) or, if frame_folder is given (or ffmpeg is
+    not installed), as frame_000000.png, ... into frame_folder.
+
+    source_fps: source samples per second of video at the original speed;
+    the samples are decimated (or repeated) to fps frames per second.
+    size: (width, height) of the frames in pixels.
+    The frames are rendered in chunks of chunk_size on a process pool
+    (workers=None: one process per CPU); at most two chunks per worker are in
+    flight, so memory stays bounded however long the video.
+    """
+    indices = frame_indices(n_samples, source_fps, fps)
+    width, height = size
+    # yuv420p needs even dimensions
+    size = (width - width % 2, height - height % 2)
+
+    ffmpeg = shutil.which("ffmpeg")
+    if frame_folder is None and (filename is None or ffmpeg is None):
+        if filename is None:
+            raise ValueError("Give a video filename or a frame_folder")
+        frame_folder = os.path.splitext(filename)[0] + "_frames"
+        print(f"ffmpeg not found; saving the frames to {frame_folder}")
+
+    encoder = None
+    if frame_folder is not None:
+        os.makedirs(frame_folder, exist_ok=True)
+    else:
+        encoder = subprocess.Popen(
+            [
+                ffmpeg,
+                "-y",
+                "-loglevel",
+                "error",
+                "-f",
+                "rawvideo",
+                "-pix_fmt",
+                "rgb24",
+                "-s",
+                f"{size[0]}x{size[1]}",
+                "-r",
+                str(fps),
+                "-i",
+                "-",
+                "-c:v",
+                "libx264",
+                "-pix_fmt",
+                "yuv420p",
+                filename,
+            ],
+            stdin=subprocess.PIPE,
+        )
+
+    def write(frames):
+        if encoder is not None:
+            for frame in frames:
+                encoder.stdin.write(frame)
+        pbar.update(len(frames))
+
+    workers = workers or os.cpu_count()
+    print(f"Rendering {len(indices)} frames of {size[0]}x{size[1]} at {fps} fps")
+    pbar = tqdm(total=len(indices))
+    with ProcessPoolExecutor(
+        max_workers=workers,
+        initializer=init_export_worker,
+        initargs=(scene, data, size, dpi, trail_length, fade),
+    ) as executor:
+        # at most two chunks per worker in flight; they are written in order
+        pending = deque()
+        for start in range(0, len(indices), chunk_size):
+            chunk = indices[start : start + chunk_size]
+            pending.append(executor.submit(render_chunk, chunk, frame_folder, start))
+            if len(pending) >= 2 * workers:
+                write(pending.popleft().result())
+        while pending:
+            write(pending.popleft().result())
+    pbar.close()
+
+    if encoder is not None:
+        encoder.stdin.close()
+        encoder.wait()
+        print(f"Animation saved to: {filename}")
+    else:
+        print(f"Frames saved to: {frame_folder}")
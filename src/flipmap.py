@@ -0,0 +1,133 @@
+import numpy as np
+from matplotlib.figure import Figure
+from tqdm import tqdm
+import os
+
+from dynamics import g, m1, m2, L1, L2, energy_error, lagrange_equations
+from ensemble import integrate_ensemble
+
+
+def flip_condition(t, y):
+    # positive once either arm has flipped over (|q| > pi)
+    return np.maximum(np.abs(y[0]), np.abs(y[1])) - np.pi
+
+
+def can_flip(q1_0, q2_0):
+    """
+    Whether an arm released from rest at (q1_0, q2_0) has enough energy to flip.
+    Flipping the lower arm needs at least the potential energy of (q1, q2) = (0, pi),
+    flipping the upper arm at least that of (pi, 0).
+    """
+    V = -(m1 + m2) * g * L1 * np.cos(q1_0) - m2 * g * L2 * np.cos(q2_0)
+    V_flip = min(-(m1 + m2) * g * L1 + m2 * g * L2, (m1 + m2) * g * L1 - m2 * g * L2)
+    return V >= V_flip
+
+
+def flip_time_map(
+    n=512,
+    t_max=100.0,
+    tile=256,
+    rtol=1e-8,
+    atol=1e-8,
+    dtype=np.float64,
+    energy_tolerance=1e-3,
+    resume=True,
+    folder_name=".",
+):
+    """
+    Flip-time fractal: the time until either arm first flips over, for an n x n grid
+    of initial angles (q1_0, q2_0) released from rest, at the centres of the n x n
+    pixels of [-pi, pi]^2. The grid never touches |q| = pi, where the flip
+    condition holds from the start and the flip time would be 0.
+
+    The grid is processed tile by tile (tile x tile trajectories integrated together
+    with integrate_ensemble); a trajectory is retired as soon as it flips, so later
+    steps only integrate the ones still active. Grid points without the energy to
+    flip are not integrated at all.
+    The times stream into the memory-mapped flip_times.npy (float32, rows: q2_0,
+    columns: q1_0; NaN: no flip before t_max, inf: flip energetically impossible),
+    and the finished tiles are recorded in flip_times_done.npy, so an interrupted
+    run resumes where it stopped (resume=True).
+    dtype=np.float32 integrates the tiles in single precision (see
+    integrate_ensemble); the trajectories whose relative energy_error at the flip
+    (or at t_max) exceeds energy_tolerance are integrated again in float64.
+    """
+    n_tiles = int(np.ceil(n / tile))
+    times_path = os.path.join(folder_name, "flip_times.npy")
+    done_path = os.path.join(folder_name, "flip_times_done.npy")
+
+    resuming = resume and os.path.exists(times_path) and os.path.exists(done_path)
+    if resuming:
+        times = np.lib.format.open_memmap(times_path, mode="r+")
+        done = np.lib.format.open_memmap(done_path, mode="r+")
+        if times.shape != (n, n) or done.shape != (n_tiles, n_tiles):
+            raise ValueError(
+                f"{times_path} was computed for another grid; use resume=False"
+            )
+    else:
+        times = np.lib.format.open_memmap(
+            times_path, mode="w+", dtype=np.float32, shape=(n, n)
+        )
+        done = np.lib.format.open_memmap(
+            done_path, mode="w+", dtype=bool, shape=(n_tiles, n_tiles)
+        )
+
+    # the centres of n cells over [-pi, pi]: no point starts on the flip boundary
+    q = -np.pi + (np.arange(n) + 0.5) * (2 * np.pi / n)
+    todo = [(i, j) for i in range(n_tiles) for j in range(n_tiles) if not done[i, j]]
+    print(f"Calculating flip times on a {n} x {n} grid ({len(todo)} tiles to go)")
+
+    for i, j in tqdm(todo):
+        rows = slice(i * tile, min((i + 1) * tile, n))
+        cols = slice(j * tile, min((j + 1) * tile, n))
+        Q1, Q2 = np.meshgrid(q[cols], q[rows])
+
+        tile_times = np.full(Q1.shape, np.inf)
+        flips = can_flip(Q1, Q2)
+        if np.any(flips):
+            y0 = np.array(
+                [Q1[flips], Q2[flips], np.zeros(flips.sum()), np.zeros(flips.sum())]
+            )
+            _, t_flip = integrate_ensemble(
+                lagrange_equations,
+                (0, t_max),
+                y0,
+                rtol=rtol,
+                atol=atol,
+                stop=flip_condition,
+                dtype=dtype,
+                check=lambda y0, y: energy_error(y0, y) > energy_tolerance,
+            )
+            tile_times[flips] = t_flip
+
+        times[rows, cols] = tile_times
+        times.flush()
+        # mark the tile done only once its times are on disk
+        done[i, j] = True
+        done.flush()
+
+    plot_flip_map(times, t_max, folder_name=folder_name)
+    return times
+
+
+def plot_flip_map(times, t_max, folder_name="."):
+    fig = Figure(figsize=(7, 6))
+    ax = fig.subplots()
+    # log of the flip time; the points that never flip are left blank
+    values = np.where(np.isfinite(times), times, np.nan)
+    with np.errstate(divide="ignore"):
+        image = ax.imshow(
+            np.log10(values),
+            origin="lower",
+            extent=(-np.pi, np.pi, -np.pi, np.pi),
+            cmap="twilight_shifted",
+            vmin=np.log10(min(1.0, t_max)),
+            vmax=np.log10(t_max),
+        )
+    fig.colorbar(image, ax=ax, label="log10(flip time)")
+    ax.set_xlabel("q1(0)")
+    ax.set_ylabel("q2(0)")
+    ax.set_title("Double Pendulum flip-time map")
+    fig_name = os.path.join(folder_name, "flip_times.png")
+    fig.savefig(fig_name, dpi=200, bbox_inches="tight")
+    print(f"Flip-time map saved to: {fig_name}")
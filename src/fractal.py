@@ -1,17 +1,21 @@
-import matplotlib.pyplot as plt
 import numpy as np
+from scipy.spatial import cKDTree
+from scipy.special import digamma
 import os
+from concurrent.futures import ProcessPoolExecutor
 
+from profiling import RunProfile
 
-def calculate_occupied_boxes(points=None, i1=0, i2=1, r=2, bbox=(-1, 1, -1, 1)):
+# matplotlib is only imported by the functions that draw, so the box counting
+# can be used by the headless command line without loading it
+
+
+def box_indices(points=None, i1=0, i2=1, r=2, bbox=(-1, 1, -1, 1)):
     """
-    Calculates the number of boxes of size 'r' that contain at least one point.
+    Integer indices (box_x, box_y) of the box of size 'r' containing every point.
     bbox: (min_x, max_x, min_y, max_y)
     """
 
-    if points is None:
-        return 0
-
     min_x, max_x, min_y, max_y = bbox
 
     # Handle cases where the bounding box might be a single point or line
@@ -27,27 +31,377 @@ def calculate_occupied_boxes(points=None, i1=0, i2=1, r=2, bbox=(-1, 1, -1, 1)):
     num_boxes_x = int(np.ceil(effective_width / r))
     num_boxes_y = int(np.ceil(effective_height / r))
 
-    occupied_boxes = set()
+    box_x = np.floor((np.asarray(points[i1]) - min_x) / r).astype(np.int64)
+    box_y = np.floor((np.asarray(points[i2]) - min_y) / r).astype(np.int64)
 
-    for p_x, p_y in zip(points[i1], points[i2]):
-        box_x = int(np.floor((p_x - min_x) / r))
-        box_y = int(np.floor((p_y - min_y) / r))
+    # Clamp indices to prevent going out of bounds due to floating point inaccuracies
+    np.minimum(box_x, num_boxes_x - 1, out=box_x)
+    np.minimum(box_y, num_boxes_y - 1, out=box_y)
 
-        # Clamp indices to prevent going out of bounds due to floating point inaccuracies
-        box_x = min(box_x, num_boxes_x - 1)
-        box_y = min(box_y, num_boxes_y - 1)
+    return box_x, box_y
 
-        occupied_boxes.add((box_x, box_y))
 
-    return len(occupied_boxes)
+def unique_boxes(box_x, box_y):
+    """
+    The distinct boxes among the (box_x, box_y) indices, as a (K, 2) integer array.
+    Both indices are packed into one int64 key, so only a flat array is sorted.
+    """
 
+    if len(box_x) == 0:
+        return np.zeros((0, 2), dtype=np.int64)
 
-def calculate_fractal_dimension(
-    points=None, i1=0, i2=1, bbox=(-1, 1, -1, 1), num_boxes=6, folder_name="."
+    x0, y0 = box_x.min(), box_y.min()
+    span_y = box_y.max() - y0 + 1
+    keys = np.sort((box_x - x0) * span_y + (box_y - y0))
+    # keep the first of every run of equal keys
+    keys = keys[np.concatenate(([True], keys[1:] != keys[:-1]))]
+    return np.column_stack((keys // span_y + x0, keys % span_y + y0))
+
+
+def calculate_occupied_boxes(points=None, i1=0, i2=1, r=2, bbox=(-1, 1, -1, 1)):
+    """
+    Calculates the number of boxes of size 'r' that contain at least one point.
+    bbox: (min_x, max_x, min_y, max_y)
+    """
+
+    if points is None:
+        return 0
+
+    return len(unique_boxes(*box_indices(points=points, i1=i1, i2=i2, r=r, bbox=bbox)))
+
+
+def box_sizes_for(bbox=(-1, 1, -1, 1), num_boxes=6):
+    # box sizes max_dim / 2**(i+1), i = 0 .. num_boxes-1
+    min_x, max_x, min_y, max_y = bbox
+    # Calculate max dimension of the bounding box for box size scaling
+    max_dim = max(max_x - min_x, max_y - min_y)
+    if max_dim == 0:  # Handle case of single point
+        max_dim = 1.0  # Arbitrary small value to allow box sizes to be calculated
+    return [max_dim / (2 ** (i + 1)) for i in range(num_boxes)]
+
+
+def calculate_occupied_boxes_multiscale(
+    points=None, i1=0, i2=1, bbox=(-1, 1, -1, 1), num_boxes=6
+):
+    """
+    Occupied boxes at every box size of box_sizes_for(bbox, num_boxes) in one pass.
+    The points are binned once at the finest size; since the sizes halve from one
+    level to the next, the indices of a coarser level are right shifts of the
+    finest ones, applied to the (few) distinct finest boxes only.
+    Returns (box_sizes, occupied), occupied[i] being the (K_i, 2) array of the
+    indices of the boxes of size box_sizes[i] that contain at least one point.
+    """
+
+    box_sizes = box_sizes_for(bbox=bbox, num_boxes=num_boxes)
+    if not box_sizes:
+        return box_sizes, []
+
+    finest = unique_boxes(
+        *box_indices(points=points, i1=i1, i2=i2, r=box_sizes[-1], bbox=bbox)
+    )
+    occupied = []
+    for level in range(num_boxes):
+        shift = num_boxes - 1 - level
+        if shift == 0:
+            occupied.append(finest)
+        else:
+            occupied.append(unique_boxes(finest[:, 0] >> shift, finest[:, 1] >> shift))
+    return box_sizes, occupied
+
+
+class BoxCounter:
+    """
+    Streaming box counting on a fixed grid: the occupied boxes at every size of
+    box_sizes_for(bbox, num_boxes), updated as batches of points arrive (add), so
+    the dimension can be re-estimated after each batch without binning the
+    earlier points again. Only the distinct finest boxes are kept; the coarser
+    levels are right shifts of them, as in calculate_occupied_boxes_multiscale.
+    """
+
+    def __init__(self, bbox=(-1, 1, -1, 1), num_boxes=7):
+        self.bbox = bbox
+        self.box_sizes = box_sizes_for(bbox=bbox, num_boxes=num_boxes)
+        self.finest = np.zeros((0, 2), dtype=np.int64)
+        self.n_points = 0
+
+    def add(self, points, i1=0, i2=1):
+        x, y = np.asarray(points[i1]), np.asarray(points[i2])
+        finite = np.isfinite(x) & np.isfinite(y)
+        box_x, box_y = box_indices(
+            points=(x[finite], y[finite]),
+            i1=0,
+            i2=1,
+            r=self.box_sizes[-1],
+            bbox=self.bbox,
+        )
+        # points (slightly) outside the grid go to its edge boxes
+        np.maximum(box_x, 0, out=box_x)
+        np.maximum(box_y, 0, out=box_y)
+        self.finest = unique_boxes(
+            np.concatenate((self.finest[:, 0], box_x)),
+            np.concatenate((self.finest[:, 1], box_y)),
+        )
+        self.n_points += int(finite.sum())
+
+    def counts(self):
+        # number of occupied boxes at every box size
+        num_boxes = len(self.box_sizes)
+        return np.array(
+            [
+                len(
+                    unique_boxes(self.finest[:, 0] >> shift, self.finest[:, 1] >> shift)
+                )
+                for shift in range(num_boxes - 1, -1, -1)
+            ]
+        )
+
+    def dimension(self):
+        counts = self.counts()
+        if counts[-1] == 0:
+            return np.nan
+        return np.polyfit(-np.log(self.box_sizes), np.log(counts), 1)[0]
+
+
+# points shared with the frame rendering workers (set once per worker process)
+frame_points = None
+
+
+def box_counting_dimension(points=None, i1=0, i2=1, bbox=(-1, 1, -1, 1), num_boxes=6):
+    """
+    The box-counting dimension alone, without frames or plots.
+    Returns (dimension, box_sizes, counts of occupied boxes).
+    """
+    box_sizes, occupied = calculate_occupied_boxes_multiscale(
+        points=points, i1=i1, i2=i2, bbox=bbox, num_boxes=num_boxes
+    )
+    counts = np.array([len(boxes) for boxes in occupied])
+    dimension = np.polyfit(-np.log(box_sizes), np.log(counts), 1)[0]
+    return dimension, box_sizes, counts
+
+
+def plane_points(points=None, i1=0, i2=1, seed=0):
+    # the finite points (x, y) of the plane (i1, i2) as an (N, 2) array, shuffled
+    xy = np.column_stack((np.asarray(points[i1]), np.asarray(points[i2])))
+    xy = xy[np.all(np.isfinite(xy), axis=1)]
+    return xy[np.random.default_rng(seed).permutation(len(xy))]
+
+
+def subsample_trees(xy, n_centers):
+    """
+    KD-trees of the prefixes of the shuffled points of sizes N, N/4, N/16, ...
+    (none smaller than n_centers), built on first use: random subsamples, nested
+    so that all of them contain the centers xy[:n_centers].
+    """
+    sizes = [len(xy)]
+    while sizes[-1] // 4 >= max(n_centers, 2):
+        sizes.append(sizes[-1] // 4)
+    trees = {}
+
+    def tree(size):
+        if size not in trees:
+            trees[size] = cKDTree(xy[:size])
+        return trees[size]
+
+    return sizes, tree
+
+
+def scaling_region(x, y, min_points=5, tolerance=0.1):
+    """
+    The scaling region of a log-log curve: the widest run of consecutive points
+    (at least min_points) whose local slopes stay within tolerance (relative) of
+    their median; among equally wide runs, the straightest one.
+    Returns (start, stop), the slice of the points of the region.
+    """
+    slopes = np.diff(y) / np.diff(x)
+    n = len(x)
+    best, best_spread = (0, n), np.inf
+    for width in range(n, min(min_points, n) - 1, -1):
+        for start in range(n - width + 1):
+            window = slopes[start : start + width - 1]
+            if len(window) == 0:
+                continue
+            spread = (window.max() - window.min()) / max(abs(np.median(window)), 1e-12)
+            if spread < best_spread:
+                best, best_spread = (start, start + width), spread
+        if best_spread <= tolerance:
+            break
+    return best
+
+
+def correlation_dimension(
+    points=None,
+    i1=0,
+    i2=1,
+    radii=None,
+    n_centers=10000,
+    n_points=None,
+    neighbors=1000,
+    min_pairs=100,
+    workers=-1,
+    seed=0,
+    min_points=5,
+    tolerance=0.1,
 ):
+    """
+    Correlation dimension (Grassberger-Procaccia) of the points of the plane
+    (i1, i2): the slope of log C(r) against log r in the scaling region, C(r)
+    being the fraction of the pairs of points closer than r.
+    The pairs are counted with KD-tree ball queries (in parallel, workers=-1:
+    all CPUs) around n_centers random centers, against a random subsample of the
+    n_points (default: all) points just large enough to find about neighbors
+    points per center; the subsample shrinks as r grows, so the cost stays close
+    to O(N log N) over all the radii.
+    radii: default 24 radii from 1e-4 to 0.5 times the extent of the points.
+    Returns (dimension, radii, C(r), (start, stop) of the scaling region); the
+    radii with fewer than min_pairs pairs are left out.
+    """
+    xy = plane_points(points, i1, i2, seed)
+    if n_points is not None:
+        xy = xy[:n_points]
+    n_centers = min(n_centers, len(xy))
+    if radii is None:
+        extent = np.max(np.ptp(xy, axis=0))
+        radii = np.geomspace(1e-4 * extent, 0.5 * extent, 24)
+    radii = np.sort(np.asarray(radii, dtype=float))
+
+    sizes, tree = subsample_trees(xy, n_centers)
+    centers = xy[:n_centers]
+    correlation = np.zeros(len(radii))
+    pairs = np.zeros(len(radii), dtype=np.int64)
+    expected = 0.0  # C(r) expected from the previous radius, for a dimension <= 2
+    for i, r in enumerate(radii):
+        size = sizes[0]
+        for candidate in sizes:
+            if candidate * expected >= neighbors:
+                size = candidate
+        counts = tree(size).query_ball_point(
+            centers, r, return_length=True, workers=workers
+        )
+        pairs[i] = counts.sum() - n_centers  # without each center itself
+        correlation[i] = pairs[i] / (n_centers * (size - 1))
+        if i + 1 < len(radii):
+            expected = correlation[i] * (radii[i + 1] / r) ** 2
+
+    keep = pairs >= min_pairs
+    radii, correlation = radii[keep], correlation[keep]
+    if len(radii) < 2:
+        raise ValueError("Too few pairs of points for the correlation dimension")
+    start, stop = scaling_region(
+        np.log(radii), np.log(correlation), min_points, tolerance
+    )
+    dimension = np.polyfit(
+        np.log(radii[start:stop]), np.log(correlation[start:stop]), 1
+    )[0]
+    return dimension, radii, correlation, (start, stop)
+
+
+def information_dimension(
+    points=None,
+    i1=0,
+    i2=1,
+    n_centers=10000,
+    n_points=None,
+    max_neighbors=256,
+    workers=-1,
+    seed=0,
+    min_points=5,
+    tolerance=0.1,
+):
+    """
+    Information dimension of the points of the plane (i1, i2), by the fixed-mass
+    method: the distance r_k from a point to its k-th nearest neighbor encloses
+    the mass p = k / N, and <log r_k> ~ log(p) / D1 over the points.
+    The k = 1, 2, 4, ..., max_neighbors nearest neighbors of n_centers random
+    centers are found with KD-tree queries (in parallel, workers=-1: all CPUs) in
+    random subsamples of N, N/4, N/16, ... of the n_points (default: all)
+    points, so the masses span many decades at the cost of a few queries.
+    log p is taken as digamma(k) - digamma(N), which removes the bias of
+    <log r_k> at small k.
+    Returns (dimension, radii exp<log r_k>, masses p, (start, stop) of the
+    scaling region), sorted by radius.
+    """
+    xy = plane_points(points, i1, i2, seed)
+    if n_points is not None:
+        xy = xy[:n_points]
+    n_centers = min(n_centers, len(xy))
+    sizes, tree = subsample_trees(xy, n_centers)
+    centers = xy[:n_centers]
+
+    log_radii, log_masses = [], []
+    for size in sizes:
+        k = 2 ** np.arange(int(np.log2(min(max_neighbors, size - 1))) + 1)
+        # k + 1 neighbors: the first is the center itself
+        distances = tree(size).query(centers, k=k + 1, workers=workers)[0]
+        with np.errstate(divide="ignore"):
+            log_distances = np.log(distances)
+        log_distances[~np.isfinite(log_distances)] = np.nan  # duplicate points
+        log_radii.extend(np.nanmean(log_distances, axis=0))
+        log_masses.extend(digamma(k) - digamma(size))
+
+    log_radii, log_masses = np.array(log_radii), np.array(log_masses)
+    order = np.argsort(log_radii)
+    log_radii, log_masses = log_radii[order], log_masses[order]
+    start, stop = scaling_region(log_radii, log_masses, min_points, tolerance)
+    dimension = np.polyfit(log_radii[start:stop], log_masses[start:stop], 1)[0]
+    return dimension, np.exp(log_radii), np.exp(log_masses), (start, stop)
+
+
+def init_frame_worker(x, y):
+    global frame_points
+    frame_points = (x, y)
+
+
+def draw_boxes(ax, occupied, r, bbox, box_style="collection"):
+    """
+    Draws the occupied boxes of size r in a single artist:
+    box_style="collection": one PolyCollection built from the box corners,
+    box_style="mask": one rasterized imshow image of the occupied boxes.
+    """
+    from matplotlib.collections import PolyCollection
+
+    min_x, max_x, min_y, max_y = bbox
+    facecolor = (66 / 255, 153 / 255, 225 / 255, 0.5)
+
+    if box_style == "collection":
+        corners = np.array([[0, 0], [1, 0], [1, 1], [0, 1]])
+        verts = (occupied[:, None, :] + corners[None, :, :]) * r + np.array(
+            [min_x, min_y]
+        )
+        ax.add_collection(
+            PolyCollection(
+                verts, facecolors=facecolor, edgecolors="#4299E1", linewidths=1.5
+            )
+        )
+    elif box_style == "mask":
+        if len(occupied) == 0:
+            return
+        x0, y0 = occupied.min(axis=0)
+        x1, y1 = occupied.max(axis=0) + 1
+        mask = np.zeros((y1 - y0, x1 - x0, 4))
+        mask[occupied[:, 1] - y0, occupied[:, 0] - x0] = facecolor
+        ax.imshow(
+            mask,
+            origin="lower",
+            interpolation="nearest",
+            extent=(min_x + x0 * r, min_x + x1 * r, min_y + y0 * r, min_y + y1 * r),
+            zorder=1,
+        )
+    else:
+        raise ValueError(f"Unknown box style: {box_style}")
+
+
+def render_box_frame(frame, r, occupied, bbox, folder_name, box_style="collection"):
+    """
+    Draws the points and the occupied boxes of size r and saves the frame as PNG.
+    Uses a bare Figure (Agg canvas), so it runs in worker processes without pyplot.
+    """
+    from matplotlib.figure import Figure
+
+    x, y = frame_points
 
     # --- Setup Plot ---
-    fig_viz, ax_viz = plt.subplots(figsize=(8, 8))
+    fig_viz = Figure(figsize=(8, 8))
+    ax_viz = fig_viz.subplots()
     ax_viz.set_aspect("equal", adjustable="box")
     ax_viz.set_title("Fractal Dimension: Box-Counting Method")
     ax_viz.set_xlabel("X-coordinate")
@@ -72,94 +426,104 @@ def calculate_fractal_dimension(
     ax_viz.set_xlim(center_x - half_range, center_x + half_range)
     ax_viz.set_ylim(center_y - half_range, center_y + half_range)
 
-    # Calculate max dimension of the bounding box for box size scaling
-    max_dim = max(max_x - min_x, max_y - min_y)
-    if max_dim == 0:  # Handle case of single point
-        max_dim = 1.0  # Arbitrary small value to allow box sizes to be calculated
-
-    # Define a range of box sizes (r)
-    box_sizes = [max_dim / (2 ** (i + 1)) for i in range(num_boxes)]
-    if not box_sizes:  # Ensure at least one box size if max_dim was very small
-        box_sizes = [1.0]
-
-    # Initialize plot elements
-    (point_plot,) = ax_viz.plot(
-        points[i1],
-        points[i2],
-        ",",
-        markersize=0.2,
-        color="#4A5568",
-        label="Points",
-    )
-    rect_patches = []  # To store the rectangles for occupied boxes
-    current_info_text = ax_viz.text(
+    ax_viz.plot(x, y, ",", markersize=0.2, color="#4A5568", label="Points")
+    draw_boxes(ax_viz, occupied, r, bbox, box_style=box_style)
+    ax_viz.text(
         0.02,
         0.98,
-        "Box Size (r): 0.00\nOccupied Boxes (N(r)): 0",
+        f"Box Size (r): {r:.2f}\nOccupied Boxes (N(r)): {len(occupied)}",
         transform=ax_viz.transAxes,
         verticalalignment="top",
         fontsize=10,
         bbox=dict(boxstyle="round,pad=0.5", fc="white", ec="gray", lw=0.5, alpha=0.8),
     )
 
-    # --- Save Each Frame as PNG and Data ---
-    print("Saving individual frames and data...")
-
-    # Create a list to store the data
-    box_data = []
+    # Save the frame
+    filename = os.path.join(folder_name, f"frame_{frame:02d}_r_{r:.2f}.png")
+    fig_viz.savefig(filename, dpi=150, bbox_inches="tight")
+    return filename
+
+
+def render_box_frames(
+    points,
+    i1,
+    i2,
+    box_sizes,
+    occupied,
+    bbox,
+    folder_name,
+    box_style="collection",
+    workers=None,
+):
+    """
+    Renders one frame per box size. With workers != 1 the frames are exported
+    in parallel from a process pool (workers=None: one process per CPU).
+    """
 
-    for frame in range(len(box_sizes)):
-        # Clear previous rectangles
-        for rect in rect_patches:
-            rect.remove()
-        rect_patches.clear()
+    x, y = np.asarray(points[i1]), np.asarray(points[i2])
+    tasks = [
+        (frame, r, occupied[frame], bbox, folder_name, box_style)
+        for frame, r in enumerate(box_sizes)
+    ]
 
-        # Get current box size
-        r = box_sizes[frame]
+    if workers is None:
+        workers = min(len(tasks), os.cpu_count() or 1)
+    if workers <= 1:
+        init_frame_worker(x, y)
+        return [render_box_frame(*task) for task in tasks]
 
-        # Calculate occupied boxes
-        occupied_count = calculate_occupied_boxes(
-            points=points, i1=i1, i2=i2, r=r, bbox=bbox
-        )
+    with ProcessPoolExecutor(
+        max_workers=workers, initializer=init_frame_worker, initargs=(x, y)
+    ) as executor:
+        futures = [executor.submit(render_box_frame, *task) for task in tasks]
+        return [future.result() for future in futures]
 
-        # Store the data
-        box_data.append((-np.log(r), np.log(occupied_count)))
-
-        # Draw occupied boxes
-        min_x, max_x, min_y, max_y = bbox
-        num_boxes_x = int(np.ceil((max_x - min_x) / r)) if (max_x - min_x) > 0 else 1
-        num_boxes_y = int(np.ceil((max_y - min_y) / r)) if (max_y - min_y) > 0 else 1
-
-        occupied_set = set()
-        for p_x, p_y in zip(points[i1], points[i2]):
-            box_x = int(np.floor((p_x - min_x) / r))
-            box_y = int(np.floor((p_y - min_y) / r))
-            box_x = min(box_x, num_boxes_x - 1)
-            box_y = min(box_y, num_boxes_y - 1)
-            occupied_set.add((box_x, box_y))
-
-        for bx, by in occupied_set:
-            rect = plt.Rectangle(
-                (min_x + bx * r, min_y + by * r),
-                r,
-                r,
-                facecolor=(66 / 255, 153 / 255, 225 / 255, 0.5),
-                edgecolor="#4299E1",
-                linewidth=1.5,
-            )
-            ax_viz.add_patch(rect)
-            rect_patches.append(rect)
 
-        # Update info text
-        current_info_text.set_text(
-            f"Box Size (r): {r:.2f}\nOccupied Boxes (N(r)): {occupied_count}"
+def calculate_fractal_dimension(
+    points=None,
+    i1=0,
+    i2=1,
+    bbox=(-1, 1, -1, 1),
+    num_boxes=6,
+    folder_name=".",
+    box_style="collection",
+    workers=None,
+    profile=None,
+):
+    # profile: optional RunProfile, timing the box counting and the rendering
+    if profile is None:
+        profile = RunProfile()
+
+    # Define a range of box sizes (r) and find the occupied boxes for all of them
+    with profile.timer("box_counting"):
+        box_sizes, occupied = calculate_occupied_boxes_multiscale(
+            points=points, i1=i1, i2=i2, bbox=bbox, num_boxes=num_boxes
         )
+    if not box_sizes:  # Ensure at least one box size if max_dim was very small
+        box_sizes = [1.0]
+        occupied = [
+            unique_boxes(*box_indices(points=points, i1=i1, i2=i2, r=1.0, bbox=bbox))
+        ]
 
-        # Save the frame
-        filename = os.path.join(folder_name, f"frame_{frame:02d}_r_{r:.2f}.png")
-        plt.savefig(filename, dpi=150, bbox_inches="tight")
+    # Store the data
+    box_data = [
+        (-np.log(r), np.log(len(boxes))) for r, boxes in zip(box_sizes, occupied)
+    ]
 
-    plt.close(fig_viz)
+    # --- Save Each Frame as PNG and Data ---
+    print("Saving individual frames and data...")
+    with profile.timer("rendering"):
+        render_box_frames(
+            points,
+            i1,
+            i2,
+            box_sizes,
+            occupied,
+            bbox,
+            folder_name,
+            box_style=box_style,
+            workers=workers,
+        )
 
     # Save the box counting data to a file
     data_filename = os.path.join(folder_name, "box_counting_data.txt")
@@ -188,29 +552,32 @@ def calculate_fractal_dimension(
     fit_line = np.poly1d(coefficients)
 
     # --- Plotting the log-log fit ---
-    fig_fit, ax_fit = plt.subplots(figsize=(8, 6))
-    ax_fit.scatter(
-        x_data, y_data, color="blue", label="Data Points: (log(1/r), log(N(r)))"
-    )
-    ax_fit.plot(
-        x_data,
-        fit_line(x_data),
-        color="red",
-        linestyle="--",
-        label=f"Linear Fit (D = {fractal_dimension:.4f})",
-    )
+    with profile.timer("rendering"):
+        import matplotlib.pyplot as plt
 
-    ax_fit.set_title(
-        f"Box-Counting Method: Log-Log Plot\nFractal Dimension D = {fractal_dimension:.4f}"
-    )
-    ax_fit.set_xlabel("log(1/r)")
-    ax_fit.set_ylabel("log(N(r))")
-    ax_fit.legend()
-    ax_fit.grid(True, linestyle="--", alpha=0.6)
-
-    # Save the log-log plot
-    fit_filename = os.path.join(folder_name, "fractal_dimension_fit.png")
-    plt.savefig(fit_filename, dpi=300, bbox_inches="tight")
-    print(f"Fractal dimension fit plot saved to: {fit_filename}")
-    plt.close(fig_fit)  # Close the fit figure
+        fig_fit, ax_fit = plt.subplots(figsize=(8, 6))
+        ax_fit.scatter(
+            x_data, y_data, color="blue", label="Data Points: (log(1/r), log(N(r)))"
+        )
+        ax_fit.plot(
+            x_data,
+            fit_line(x_data),
+            color="red",
+            linestyle="--",
+            label=f"Linear Fit (D = {fractal_dimension:.4f})",
+        )
+
+        ax_fit.set_title(
+            f"Box-Counting Method: Log-Log Plot\nFractal Dimension D = {fractal_dimension:.4f}"
+        )
+        ax_fit.set_xlabel("log(1/r)")
+        ax_fit.set_ylabel("log(N(r))")
+        ax_fit.legend()
+        ax_fit.grid(True, linestyle="--", alpha=0.6)
+
+        # Save the log-log plot
+        fit_filename = os.path.join(folder_name, "fractal_dimension_fit.png")
+        plt.savefig(fit_filename, dpi=300, bbox_inches="tight")
+        print(f"Fractal dimension fit plot saved to: {fit_filename}")
+        plt.close(fig_fit)  # Close the fit figure
     print(f"Calculated Fractal Dimension (D): {fractal_dimension:.4f}")
@@ -0,0 +1,209 @@
+import numpy as np
+from matplotlib.figure import Figure
+from tqdm import tqdm
+import os
+
+from dynamics import (
+    DEFAULT_PARAMETERS,
+    energy_error,
+    lagrange_equations,
+    lagrange_jacobian,
+)
+from ensemble import integrate_ensemble
+
+
+def variational_equations(t, Y, parameters=DEFAULT_PARAMETERS):
+    """
+    The Lagrange equations together with their linearization (tangent dynamics).
+    Y: (4 + 4k, N) array, the state of N trajectories followed by k tangent vectors each.
+    """
+    y = Y[:4]
+    W = Y[4:].reshape(-1, 4, Y.shape[1])  # (k, 4, N)
+    J = lagrange_jacobian(t, y, parameters)  # (4, 4, N)
+    W_dot = np.einsum("abn,kbn->kan", J, W)
+    return np.concatenate(
+        (lagrange_equations(t, y, parameters), W_dot.reshape(-1, Y.shape[1]))
+    )
+
+
+def lyapunov_indicators(
+    y0,
+    t_final,
+    renorm_interval=1.0,
+    n_vectors=1,
+    qr=False,
+    rtol=1e-9,
+    atol=1e-9,
+    seed=0,
+    parameters=DEFAULT_PARAMETERS,
+    dtype=np.float64,
+    energy_tolerance=1e-3,
+    tangent_vectors=None,
+):
+    """
+    Chaos indicators of the N trajectories starting from y0 (a (4, N) array), from
+    the tangent vectors integrated with the analytic Jacobian over [0, t_final] and
+    renormalized every renorm_interval (Benettin et al.).
+    With qr=True the n_vectors tangent vectors are re-orthonormalized (QR) at each
+    renormalization, which gives the n_vectors largest Lyapunov exponents;
+    otherwise each vector is only rescaled to unit length.
+
+    Returns a dict of arrays:
+      "lyapunov": (n_vectors, N) finite-time Lyapunov exponents (row 0: the maximal one)
+      "fli":      (N,) fast Lyapunov indicator, max over time of log|w1(t)|
+      "sali":     (N,) smaller alignment index of w1, w2 (only if n_vectors >= 2 and not qr)
+    parameters: the PendulumParameters of the system.
+    dtype=np.float32 integrates in single precision (see integrate_ensemble); the
+    trajectories whose relative energy_error at t_final exceeds energy_tolerance
+    are then computed again in float64, from the same initial tangent vectors.
+    tangent_vectors: the (N, 4, n_vectors) initial tangent vectors (default:
+    random orthonormal ones, drawn with seed).
+    """
+    y0 = np.asarray(y0, dtype=float)
+    N = y0.shape[1]
+    dtype = np.dtype(dtype)
+
+    if tangent_vectors is None:
+        # random orthonormal initial tangent vectors, (N, 4, n_vectors)
+        rng = np.random.default_rng(seed)
+        tangent_vectors, _ = np.linalg.qr(rng.normal(size=(N, 4, n_vectors)))
+    W = tangent_vectors
+
+    log_growth = np.zeros((n_vectors, N))
+    fli = np.zeros(N)
+    sali = np.full(N, np.sqrt(2)) if n_vectors >= 2 and not qr else None
+
+    y = y0
+    n_windows = int(np.ceil(t_final / renorm_interval))
+    for window in range(n_windows):
+        t_0 = window * renorm_interval
+        t_1 = min(t_0 + renorm_interval, t_final)
+        Y = np.concatenate((y, W.transpose(2, 1, 0).reshape(-1, N)))
+        Y = integrate_ensemble(
+            lambda t, Y: variational_equations(t, Y, parameters),
+            (t_0, t_1),
+            Y,
+            rtol=rtol,
+            atol=atol,
+            dtype=dtype,
+        )
+        y = Y[:4]
+        W = Y[4:].reshape(n_vectors, 4, N).transpose(2, 1, 0)
+
+        if qr:
+            W, R = np.linalg.qr(W)
+            diag = np.diagonal(R, axis1=1, axis2=2)  # (N, n_vectors)
+            # keep the orientation of the vectors
+            W = W * np.sign(diag)[:, None, :]
+            norms = np.abs(diag).T
+        else:
+            norms = np.linalg.norm(W, axis=1).T  # (n_vectors, N)
+            W = W / norms.T[:, None, :]
+            if sali is not None:
+                w1, w2 = W[:, :, 0], W[:, :, 1]
+                alignment = np.minimum(
+                    np.linalg.norm(w1 + w2, axis=1), np.linalg.norm(w1 - w2, axis=1)
+                )
+                sali = np.minimum(sali, alignment)
+
+        log_growth += np.log(norms)
+        fli = np.maximum(fli, log_growth[0])
+
+    if dtype != np.float64:
+        rerun = np.flatnonzero(energy_error(y0, y, parameters) > energy_tolerance)
+        if rerun.size:
+            exact = lyapunov_indicators(
+                y0[:, rerun],
+                t_final,
+                renorm_interval,
+                n_vectors,
+                qr,
+                rtol,
+                atol,
+                seed,
+                parameters,
+                tangent_vectors=tangent_vectors[rerun],
+            )
+            log_growth[:, rerun] = exact["lyapunov"] * t_final
+            fli[rerun] = exact["fli"]
+            if sali is not None:
+                sali[rerun] = exact["sali"]
+
+    indicators = {"lyapunov": log_growth / t_final, "fli": fli}
+    if sali is not None:
+        indicators["sali"] = sali
+    return indicators
+
+
+def chaos_map(
+    n_q1=128,
+    n_q2=128,
+    t_final=100.0,
+    q1_range=(-np.pi, np.pi),
+    q2_range=(-np.pi, np.pi),
+    renorm_interval=1.0,
+    sali=False,
+    chunk_size=4096,
+    rtol=1e-9,
+    atol=1e-9,
+    dtype=np.float64,
+    folder_name=".",
+):
+    """
+    Chaos indicator maps over a (q1, q2) grid of initial angles, released from rest.
+    The grid is integrated in batches of chunk_size trajectories (one vectorized
+    ensemble integration each), in single precision with dtype=np.float32 (see
+    lyapunov_indicators). The maps, of shape (n_q2, n_q1), are saved as
+    chaos_map_<indicator>.npy and chaos_map_<indicator>.png.
+    Returns a dict of maps: "lyapunov" (maximal LE), "fli" and optionally "sali".
+    """
+    q1 = np.linspace(*q1_range, n_q1)
+    q2 = np.linspace(*q2_range, n_q2)
+    Q1, Q2 = np.meshgrid(q1, q2)
+    y0 = np.array([Q1.ravel(), Q2.ravel(), np.zeros(Q1.size), np.zeros(Q1.size)])
+
+    maps = {"lyapunov": np.empty(Q1.size), "fli": np.empty(Q1.size)}
+    if sali:
+        maps["sali"] = np.empty(Q1.size)
+
+    print(f"Calculating the chaos indicators of {Q1.size} trajectories")
+    for start in tqdm(range(0, Q1.size, chunk_size)):
+        chunk = slice(start, start + chunk_size)
+        indicators = lyapunov_indicators(
+            y0[:, chunk],
+            t_final,
+            renorm_interval=renorm_interval,
+            n_vectors=2 if sali else 1,
+            rtol=rtol,
+            atol=atol,
+            dtype=dtype,
+        )
+        maps["lyapunov"][chunk] = indicators["lyapunov"][0]
+        maps["fli"][chunk] = indicators["fli"]
+        if sali:
+            maps["sali"][chunk] = indicators["sali"]
+
+    for name in maps:
+        maps[name] = maps[name].reshape(Q1.shape)
+        np.save(os.path.join(folder_name, f"chaos_map_{name}.npy"), maps[name])
+        plot_chaos_map(maps[name], name, q1_range, q2_range, folder_name=folder_name)
+    return maps
+
+
+def plot_chaos_map(values, name, q1_range, q2_range, folder_name="."):
+    fig = Figure(figsize=(7, 6))
+    ax = fig.subplots()
+    image = ax.imshow(
+        np.log10(np.maximum(values, 1e-16)) if name == "sali" else values,
+        origin="lower",
+        extent=(*q1_range, *q2_range),
+        cmap="magma",
+        aspect="auto",
+    )
+    fig.colorbar(image, ax=ax, label="log10(SALI)" if name == "sali" else name)
+    ax.set_xlabel("q1(0)")
+    ax.set_ylabel("q2(0)")
+    ax.set_title(f"Double Pendulum chaos map ({name})")
+    fig_name = os.path.join(folder_name, f"chaos_map_{name}.png")
+    fig.savefig(fig_name, dpi=200, bbox_inches="tight")
+    print(f"Chaos map saved to: {fig_name}")
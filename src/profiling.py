@@ -0,0 +1,160 @@
+import numpy as np
+from contextlib import contextmanager
+import datetime
+import json
+import time
+import csv
+import os
+
+
+class RunProfile:
+    """
+    Instrumentation of one simulation run: wall time per phase (integration,
+    crossing detection, box counting, rendering, ...), counters (right-hand side
+    calls, solver statistics, crossings) and the energy drift.
+    The functions that take a profile= argument record into it; write() saves the
+    report as <name>_profile.json and appends it to profile_runs.csv.
+    """
+
+    def __init__(self, name="run"):
+        self.name = name
+        self.date = datetime.datetime.now().isoformat(timespec="seconds")
+        self.start = time.perf_counter()
+        self.times = {}
+        self.counts = {}
+        self.energy = {}
+
+    @contextmanager
+    def timer(self, phase):
+        # adds the wall time spent in the with block to phase
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.times[phase] = self.times.get(phase, 0.0) + time.perf_counter() - start
+
+    def add(self, **counts):
+        for name, value in counts.items():
+            self.counts[name] = self.counts.get(name, 0) + int(value)
+
+    def counted(self, fun):
+        # fun, counting its calls as rhs_calls
+        def counted_fun(t, y):
+            self.counts["rhs_calls"] = self.counts.get("rhs_calls", 0) + 1
+            return fun(t, y)
+
+        return counted_fun
+
+    def add_solver_stats(self, sol):
+        # nfev, njev and nlu of a solve_ivp solution (the steps: see counted_solver)
+        self.add(nfev=sol.nfev, njev=sol.njev, nlu=sol.nlu)
+
+    def counted_solver(self, method):
+        """
+        The solve_ivp method (a name or an OdeSolver class) as a subclass counting
+        its accepted steps, and for the explicit Runge-Kutta methods the rejected
+        ones: every step attempt calls the right-hand side n_stages times inside
+        the step, while the initial step selection and the dense output (t_eval)
+        call it outside, so they are not taken for steps.
+        Raises ValueError for a name that is not a solve_ivp method.
+        """
+        import scipy.integrate
+
+        base = (
+            getattr(scipy.integrate, method, None)
+            if isinstance(method, str)
+            else method
+        )
+        if not (isinstance(base, type) and issubclass(base, scipy.integrate.OdeSolver)):
+            raise ValueError(f"Unknown solve_ivp method: {method}")
+        n_stages = getattr(base, "n_stages", None)
+        profile = self
+
+        class CountedSolver(base):
+            def _step_impl(self):
+                nfev = self.nfev
+                success, message = super()._step_impl()
+                if success:
+                    profile.add(accepted_steps=1)
+                    if n_stages:
+                        attempts = (self.nfev - nfev) // n_stages
+                        profile.add(rejected_steps=attempts - 1)
+                return success, message
+
+        return CountedSolver
+
+    def record_energy(self, energy):
+        """
+        Energy drift along a run, from the T + V values of compute_observables.
+        A run of several trajectories (e.g. energies) records each of them; the
+        report keeps their number, the largest drifts and the initial and final
+        energies of the trajectory with the largest relative drift.
+        """
+        energy = np.asarray(energy, dtype=float)
+        energy = energy[np.isfinite(energy)]
+        if energy.size == 0:
+            return
+        drift = np.abs(energy - energy[0])
+        record = {
+            "trajectories": self.energy.get("trajectories", 0) + 1,
+            "initial": float(energy[0]),
+            "final": float(energy[-1]),
+            "max_abs_drift": float(drift.max()),
+            "max_rel_drift": float(drift.max() / max(abs(energy[0]), 1e-300)),
+        }
+        if self.energy:
+            record["max_abs_drift"] = max(
+                record["max_abs_drift"], self.energy["max_abs_drift"]
+            )
+            if self.energy["max_rel_drift"] > record["max_rel_drift"]:
+                for name in ("initial", "final", "max_rel_drift"):
+                    record[name] = self.energy[name]
+        self.energy = record
+
+    def report(self):
+        report = {
+            "name": self.name,
+            "date": self.date,
+            "wall_time": time.perf_counter() - self.start,
+            "times": dict(self.times),
+            "counts": dict(self.counts),
+            "energy": dict(self.energy),
+        }
+        crossing_time = self.times.get("integration", 0.0) + self.times.get(
+            "crossing_detection", 0.0
+        )
+        if self.counts.get("crossings") and crossing_time > 0:
+            report["crossings_per_second"] = self.counts["crossings"] / crossing_time
+        return report
+
+    def write(self, folder_name="."):
+        report = self.report()
+        json_path = os.path.join(folder_name, f"{self.name}_profile.json")
+        with open(json_path, "w") as f:
+            json.dump(report, f, indent=2)
+
+        # one row per (run, quantity), so runs recording different quantities share the file
+        csv_path = os.path.join(folder_name, "profile_runs.csv")
+        new_file = not os.path.exists(csv_path)
+        with open(csv_path, "a", newline="") as f:
+            writer = csv.writer(f)
+            if new_file:
+                writer.writerow(["name", "date", "group", "quantity", "value"])
+            writer.writerow(
+                [self.name, self.date, "", "wall_time", report["wall_time"]]
+            )
+            for group in ("times", "counts", "energy"):
+                for quantity, value in report[group].items():
+                    writer.writerow([self.name, self.date, group, quantity, value])
+            if "crossings_per_second" in report:
+                writer.writerow(
+                    [
+                        self.name,
+                        self.date,
+                        "",
+                        "crossings_per_second",
+                        report["crossings_per_second"],
+                    ]
+                )
+        print(f"Run profile saved to: {json_path}")
+        return report
@@ -0,0 +1,85 @@
+import numpy as np
+import json
+import os
+
+
+class SectionStore:
+    """
+    Append-only on-disk store of Poincare section points, with the integrator state
+    needed to resume the computation:
+      folder/chunk_00000.npy, ...  (7, n) observables of consecutive crossings
+      folder/checkpoint.json       number of chunks and points stored, the integrator
+                                   state (t, y) after the last stored crossing, and the
+                                   parameters of the run
+    The checkpoint is only updated after its chunk is on disk, and both are written
+    atomically, so an interrupted run always resumes from a consistent state.
+    """
+
+    def __init__(self, folder, params):
+        self.folder = folder
+        # through JSON, so that the parameters compare equal to the stored ones
+        self.params = json.loads(json.dumps(params))
+        os.makedirs(folder, exist_ok=True)
+
+        self.checkpoint = None
+        checkpoint_path = os.path.join(folder, "checkpoint.json")
+        if os.path.exists(checkpoint_path):
+            with open(checkpoint_path) as f:
+                self.checkpoint = json.load(f)
+            if self.checkpoint["params"] != self.params:
+                raise ValueError(
+                    f"The section stored in {folder} was computed with other parameters"
+                )
+
+    @classmethod
+    def open(cls, folder):
+        # the store written before in folder, with the parameters of its run
+        with open(os.path.join(folder, "checkpoint.json")) as f:
+            return cls(folder, json.load(f)["params"])
+
+    @property
+    def n_points(self):
+        return self.checkpoint["n_points"] if self.checkpoint else 0
+
+    @property
+    def n_chunks(self):
+        return self.checkpoint["n_chunks"] if self.checkpoint else 0
+
+    def chunk_path(self, i):
+        return os.path.join(self.folder, f"chunk_{i:05d}.npy")
+
+    def append(self, points, t, y):
+        # stores the (7, n) points, then the integrator state (t, y) reached after them
+        chunk_path = self.chunk_path(self.n_chunks)
+        np.save(chunk_path + ".tmp.npy", points)
+        os.replace(chunk_path + ".tmp.npy", chunk_path)
+
+        checkpoint = {
+            "n_chunks": self.n_chunks + 1,
+            "n_points": self.n_points + points.shape[1],
+            "t": float(t),
+            "y": [float(value) for value in y],
+            "params": self.params,
+        }
+        checkpoint_path = os.path.join(self.folder, "checkpoint.json")
+        with open(checkpoint_path + ".tmp", "w") as f:
+            json.dump(checkpoint, f)
+        os.replace(checkpoint_path + ".tmp", checkpoint_path)
+        self.checkpoint = checkpoint
+
+    def chunks(self, n_points=None):
+        # the stored (7, n) chunks one at a time (up to n_points points), for passes
+        # in bounded memory
+        n_left = self.n_points if n_points is None else n_points
+        for i in range(self.n_chunks):
+            if n_left <= 0:
+                return
+            chunk = np.load(self.chunk_path(i))[:, :n_left]
+            n_left -= chunk.shape[1]
+            yield chunk
+
+    def load(self):
+        # all the stored points, (7, n_points)
+        if self.n_chunks == 0:
+            return np.zeros((7, 0))
+        return np.concatenate(list(self.chunks()), axis=1)
@@ -0,0 +1,169 @@
+import numpy as np
+from matplotlib.figure import Figure
+from tqdm import tqdm
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import os
+
+from dynamics import (
+    PendulumParameters,
+    normalize_observables,
+    poincare_section,
+    rest_initial_conditions,
+)
+from fractal import box_counting_dimension
+from lyapunov import lyapunov_indicators
+
+
+def sweep_system(
+    i_mass,
+    i_length,
+    mass_ratio,
+    length_ratio,
+    energies,
+    n_orbits,
+    t_final,
+    Np,
+    i_section,
+    t_max,
+    rtol,
+    atol,
+):
+    """
+    One system of the sweep (runs in a worker process): the Lyapunov exponents of
+    n_orbits orbits per energy, all integrated together in one ensemble, and the
+    box-counting dimension of the Poincare section (q1, p1) of the first orbit of
+    every energy (if Np > 0).
+    """
+    parameters = PendulumParameters.from_ratios(mass_ratio, length_ratio)
+    y0 = np.concatenate(
+        [rest_initial_conditions(DeltaE, n_orbits, parameters) for DeltaE in energies],
+        axis=1,
+    )
+    indicators = lyapunov_indicators(
+        y0, t_final, rtol=rtol, atol=atol, parameters=parameters
+    )
+    lyapunov = indicators["lyapunov"][0].reshape(len(energies), n_orbits)
+
+    dimension = np.full(len(energies), np.nan)
+    for i_energy in range(len(energies) if Np > 0 else 0):
+        Observables = poincare_section(
+            y0[:, i_energy * n_orbits],
+            Np,
+            i_section,
+            t_bound=t_max,
+            progress=False,
+            parameters=parameters,
+        )
+        points = normalize_observables(Observables)
+        points = points[:, np.isfinite(points[0])]
+        if points.shape[1] > 1:
+            dimension[i_energy] = box_counting_dimension(points, 0, 4, num_boxes=6)[0]
+    return i_mass, i_length, lyapunov, dimension
+
+
+def parameter_sweep(
+    mass_ratios,
+    length_ratios,
+    energies,
+    n_orbits=16,
+    t_final=100.0,
+    Np=0,
+    i_section=1,
+    t_max=1e4,
+    rtol=1e-9,
+    atol=1e-9,
+    workers=None,
+    folder_name=".",
+):
+    """
+    Sweep over the grid of systems (m2/m1, L2/L1) in mass_ratios x length_ratios
+    (m1, L1 and g as in dynamics), and the energies DeltaE above the stable
+    equilibrium of each system. The systems are computed in parallel on a
+    process pool (workers=None: one process per CPU), each as one batch over its
+    energies and orbits (see sweep_system).
+    Saves sweep_results.npz with the grids and
+      lyapunov   (n_mass, n_length, n_energy, n_orbits) maximal Lyapunov exponents
+      dimension  (n_mass, n_length, n_energy) box-counting dimensions (NaN if Np = 0)
+    and the overview figure parameter_sweep.png.
+    Returns (lyapunov, dimension).
+    """
+    mass_ratios = np.asarray(mass_ratios, dtype=float)
+    length_ratios = np.asarray(length_ratios, dtype=float)
+    energies = np.asarray(energies, dtype=float)
+
+    shape = (len(mass_ratios), len(length_ratios), len(energies))
+    lyapunov = np.full(shape + (n_orbits,), np.nan)
+    dimension = np.full(shape, np.nan)
+
+    print(
+        f"Sweeping {len(mass_ratios)} x {len(length_ratios)} systems"
+        f" at {len(energies)} energies"
+    )
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = [
+            executor.submit(
+                sweep_system,
+                i_mass,
+                i_length,
+                mass_ratio,
+                length_ratio,
+                energies,
+                n_orbits,
+                t_final,
+                Np,
+                i_section,
+                t_max,
+                rtol,
+                atol,
+            )
+            for i_mass, mass_ratio in enumerate(mass_ratios)
+            for i_length, length_ratio in enumerate(length_ratios)
+        ]
+        for future in tqdm(as_completed(futures), total=len(futures)):
+            i_mass, i_length, system_lyapunov, system_dimension = future.result()
+            lyapunov[i_mass, i_length] = system_lyapunov
+            dimension[i_mass, i_length] = system_dimension
+
+    np.savez(
+        os.path.join(folder_name, "sweep_results.npz"),
+        mass_ratios=mass_ratios,
+        length_ratios=length_ratios,
+        energies=energies,
+        lyapunov=lyapunov,
+        dimension=dimension,
+    )
+    plot_sweep(lyapunov, mass_ratios, length_ratios, energies, folder_name)
+    return lyapunov, dimension
+
+
+def plot_sweep(lyapunov, mass_ratios, length_ratios, energies, folder_name="."):
+    # one tile per energy: the mean maximal Lyapunov exponent over (m2/m1, L2/L1)
+    n_cols = int(np.ceil(np.sqrt(len(energies))))
+    n_rows = int(np.ceil(len(energies) / n_cols))
+
+    fig = Figure(figsize=(4 * n_cols, 4 * n_rows), layout="constrained")
+    axes = fig.subplots(n_rows, n_cols, squeeze=False)
+    for ax in axes.flat[len(energies) :]:
+        ax.set_visible(False)
+
+    mean_lyapunov = np.nanmean(lyapunov, axis=3)
+    vmax = np.nanmax(mean_lyapunov) if np.any(np.isfinite(mean_lyapunov)) else 1
+    for i_energy, (ax, DeltaE) in enumerate(zip(axes.flat, energies)):
+        image = ax.pcolormesh(
+            length_ratios,
+            mass_ratios,
+            mean_lyapunov[:, :, i_energy],
+            cmap="magma",
+            vmin=0,
+            vmax=vmax,
+            shading="nearest",
+        )
+        ax.set_xlabel("L2 / L1")
+        ax.set_ylabel("m2 / m1")
+        ax.set_title(f"DeltaE = {DeltaE:g}")
+    fig.colorbar(image, ax=axes, label="mean maximal Lyapunov exponent")
+    fig.suptitle("Double Pendulum parameter sweep")
+
+    fig_name = os.path.join(folder_name, "parameter_sweep.png")
+    fig.savefig(fig_name, dpi=200, bbox_inches="tight")
+    print(f"Parameter sweep saved to: {fig_name}")
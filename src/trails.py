@@ -0,0 +1,137 @@
+import numpy as np
+from matplotlib.collections import LineCollection
+from matplotlib.colors import to_rgba
+
+
+class Trail:
+    """
+    Trail of points for FuncAnimation, whose cost per frame does not grow with the
+    number of points already drawn.
+
+    length=None: the trail keeps every point, written into arrays preallocated for
+    capacity points. In a blitted animation (the artist animated) the points drawn
+    so far are kept as an image of the axes: every frame restores it, draws only
+    the new points onto it and saves it again, and the whole history is drawn once
+    more only when the canvas is fully redrawn (e.g. on a resize). Otherwise
+    (a figure redrawn whole, as in the headless export) the line is given views of
+    the arrays, and each draw renders every point.
+    length=L: only the last L points are shown (ring buffer). Every point is written
+    twice, at i % L and i % L + L, so the last L points are always the contiguous
+    slice buffer[i % L + 1 : i % L + 1 + L] and no copy or roll is ever needed.
+    fade=True (with length): the trail is drawn as a LineCollection whose segments
+    fade out from the newest point to the oldest one.
+
+    The extra keyword arguments are passed to ax.plot (or to the LineCollection).
+    """
+
+    def __init__(self, ax, capacity, length=None, fade=False, **style):
+        if fade and length is None:
+            raise ValueError("A fading trail needs a fixed length")
+        self.length = length
+        self.n = 0  # number of points added so far
+        # points baked into the background of a blitted growing trail, and the
+        # backgrounds of the axes without and with them
+        self.drawn = 0
+        self.clean_background = self.background = None
+        size = capacity if length is None else 2 * length
+        self.x = np.empty(size)
+        self.y = np.empty(size)
+
+        if fade:
+            color = to_rgba(style.pop("color", "r"))
+            alpha = style.pop("alpha", 1.0)
+            colors = np.tile(color, (length - 1, 1))
+            colors[:, 3] = alpha * np.linspace(0, 1, length - 1) ** 2
+            self.colors = colors
+            self.segments = np.empty((length - 1, 2, 2))
+            self.artist = LineCollection([], **style)
+            ax.add_collection(self.artist)
+        else:
+            self.colors = None
+            (self.artist,) = ax.plot([], [], **style)
+        self.ax = ax
+        if length is None:
+            ax.figure.canvas.mpl_connect("draw_event", self.on_draw)
+
+    def blitting(self):
+        return self.length is None and self.artist.get_animated()
+
+    def on_draw(self, event):
+        # after a full redraw (without the animated artists): the clean background,
+        # then the whole history drawn once onto it
+        if not self.blitting():
+            return
+        canvas = self.ax.figure.canvas
+        self.clean_background = canvas.copy_from_bbox(self.ax.bbox)
+        self.artist.set_data(self.x[: self.n], self.y[: self.n])
+        self.ax.draw_artist(self.artist)
+        self.background = canvas.copy_from_bbox(self.ax.bbox)
+        self.drawn = self.n
+        self.artist.set_data([], [])
+
+    def clear(self):
+        self.n = 0
+        self.drawn = 0
+        self.background = self.clean_background
+        self.update()
+        return self.artist
+
+    def append(self, x, y):
+        return self.extend([x], [y])
+
+    def extend(self, xs, ys):
+        # adds the points (xs, ys), in order
+        xs, ys = np.asarray(xs, dtype=float), np.asarray(ys, dtype=float)
+        if self.length is None:
+            self.x[self.n : self.n + len(xs)] = xs
+            self.y[self.n : self.n + len(ys)] = ys
+        else:
+            # only the last length points can still be shown
+            dropped = max(len(xs) - self.length, 0)
+            xs, ys = xs[dropped:], ys[dropped:]
+            self.n += dropped
+            i = (self.n + np.arange(len(xs))) % self.length
+            self.x[i], self.x[i + self.length] = xs, xs
+            self.y[i], self.y[i + self.length] = ys, ys
+        self.n += len(xs)
+        self.update()
+        return self.artist
+
+    def window(self):
+        # views of the points currently shown, oldest first
+        if self.length is None or self.n <= self.length:
+            return self.x[: self.n], self.y[: self.n]
+        start = self.n % self.length
+        return (
+            self.x[start : start + self.length],
+            self.y[start : start + self.length],
+        )
+
+    def update(self):
+        if self.blitting() and self.background is not None:
+            self.bake()
+            return
+        x, y = self.window()
+        if self.colors is None:
+            self.artist.set_data(x, y)
+            return
+        n_segments = max(len(x) - 1, 0)
+        segments = self.segments[:n_segments]
+        segments[:, 0, 0], segments[:, 1, 0] = x[:-1], x[1:]
+        segments[:, 0, 1], segments[:, 1, 1] = y[:-1], y[1:]
+        self.artist.set_segments(segments)
+        # the newest segments are the most opaque
+        self.artist.set_color(self.colors[len(self.colors) - n_segments :])
+
+    def bake(self):
+        # draws the points added since the last frame onto the saved background
+        canvas = self.ax.figure.canvas
+        canvas.restore_region(self.background)
+        # from the last point drawn, so the line stays connected
+        start = max(self.drawn - 1, 0)
+        self.artist.set_data(self.x[start : self.n], self.y[start : self.n])
+        self.ax.draw_artist(self.artist)
+        self.background = canvas.copy_from_bbox(self.ax.bbox)
+        self.drawn = self.n
+        # the new points are in the background: nothing is left to blit on top
+        self.artist.set_data([], [])
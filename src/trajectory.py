@@ -0,0 +1,164 @@
+import numpy as np
+
+from dynamics import (
+    DEFAULT_PARAMETERS,
+    compute_observables,
+    integrate_dense_output,
+    lagrange_equations,
+    lagrange_jacobian,
+    trajectory_crossings,
+)
+
+
+class Trajectory:
+    """
+    One integration of the double pendulum, evaluated lazily at any times.
+    The solve keeps the states at the solver steps and the solver's own
+    interpolant of every step (see integrate_dense_output), so the states at
+    any times are those solve_ivp would give for them as t_eval.
+    The symplectic methods have no interpolant: between two steps of their grid
+    the state is the quintic Hermite interpolant of the states and of their
+    first two time derivatives, taken from lagrange_equations and
+    lagrange_jacobian when a chunk is evaluated.
+    Animations, phase plots and exports can so sample the same solve at their
+    own resolution, chunk_size times at a time, without t_eval arrays.
+    The solver arguments, cache, profile and parameters are as in
+    integrate_dense_output; with a cache, the steps are what is cached.
+    """
+
+    def __init__(
+        self,
+        y0,
+        t_span,
+        method="DOP853",
+        rtol=1e-10,
+        atol=1e-10,
+        dt=0.01,
+        cache=None,
+        profile=None,
+        parameters=DEFAULT_PARAMETERS,
+        chunk_size=4096,
+    ):
+        self.parameters = parameters
+        self.chunk_size = chunk_size
+        self.t, self.y, self.coefficients = integrate_dense_output(
+            y0,
+            t_span,
+            method,
+            rtol,
+            atol,
+            dt,
+            cache=cache,
+            profile=profile,
+            parameters=parameters,
+        )
+
+    @property
+    def t_start(self):
+        return float(self.t[0])
+
+    @property
+    def t_end(self):
+        return float(self.t[-1])
+
+    def times(self, n, t_start=None, t_end=None):
+        # n evenly spaced times over [t_start, t_end] (default: the whole solve)
+        t_start = self.t_start if t_start is None else t_start
+        t_end = self.t_end if t_end is None else t_end
+        return np.linspace(t_start, t_end, n)
+
+    def interpolate(self, t):
+        # the states (4, len(t)) at the times t of one chunk
+        tolerance = 1e-9 * max(1.0, abs(self.t_end))
+        if np.any((t < self.t_start - tolerance) | (t > self.t_end + tolerance)):
+            raise ValueError(
+                f"Times outside the integrated interval [{self.t_start}, {self.t_end}]"
+            )
+        k = np.searchsorted(self.t, t, side="right") - 1
+        k = np.clip(k, 0, len(self.t) - 2)
+
+        if self.coefficients is not None:
+            # Horner on the step interpolants: y_old + sum_j c[j] x^(j + 1)
+            c = self.coefficients[k]
+            x = ((t - self.t[k]) / (self.t[k + 1] - self.t[k]))[:, None]
+            y = c[:, -1]
+            for j in range(c.shape[1] - 2, -1, -1):
+                y = y * x + c[:, j]
+            return self.y[:, k] + (y * x).T
+
+        # the symplectic grid: derivatives only at the steps the chunk needs
+        first, last = k.min(), k.max() + 2
+        t_steps = np.asarray(self.t[first:last])
+        y = np.asarray(self.y[:, first:last])
+        # y' from the equations of motion, y'' = J y'
+        f = lagrange_equations(0, y, self.parameters)
+        f2 = np.einsum("ijn,jn->in", lagrange_jacobian(0, y, self.parameters), f)
+        k = k - first
+
+        h = t_steps[k + 1] - t_steps[k]
+        s = (t - t_steps[k]) / h
+        s3 = s**3
+        s4 = s3 * s
+        s5 = s4 * s
+        return (
+            (1 - 10 * s3 + 15 * s4 - 6 * s5) * y[:, k]
+            + (s - 6 * s3 + 8 * s4 - 3 * s5) * h * f[:, k]
+            + 0.5 * (s * s - 3 * s3 + 3 * s4 - s5) * h * h * f2[:, k]
+            + (10 * s3 - 15 * s4 + 6 * s5) * y[:, k + 1]
+            + (-4 * s3 + 7 * s4 - 3 * s5) * h * f[:, k + 1]
+            + 0.5 * (s3 - 2 * s4 + s5) * h * h * f2[:, k + 1]
+        )
+
+    def states(self, t):
+        """
+        The states (q1, q2, omega1, omega2) at the times t: a (4,) array for a
+        scalar t, a (4, len(t)) array otherwise.
+        """
+        t = np.asarray(t, dtype=float)
+        if t.ndim == 0:
+            return self.interpolate(t[None])[:, 0]
+        y = np.empty((4, len(t)))
+        for start in range(0, len(t), self.chunk_size):
+            stop = start + self.chunk_size
+            y[:, start:stop] = self.interpolate(t[start:stop])
+        return y
+
+    def observables(self, t):
+        # the (7,) or (7, len(t)) observables of compute_observables at the times t
+        return np.array(compute_observables(self.states(t), self.parameters))
+
+    def cartesian(self, t):
+        # the positions (x1, y1, x2, y2) of the two bobs at the times t
+        q1, q2 = self.states(t)[:2]
+        L1, L2 = self.parameters.L1, self.parameters.L2
+        x1 = L1 * np.sin(q1)
+        y1 = -L1 * np.cos(q1)
+        return np.array([x1, y1, x1 + L2 * np.sin(q2), y1 - L2 * np.cos(q2)])
+
+    def section(self, i_section, direction=0):
+        """
+        The Poincare section (observable i_section = 0) of the whole solve, from
+        its steps with trajectory_crossings; direction as there.
+        Returns (t_cross, the (7, n) observables at the crossings).
+        """
+        return trajectory_crossings(
+            self.t,
+            compute_observables(np.asarray(self.y), self.parameters),
+            i_section,
+            direction,
+            self.parameters,
+        )
+
+    def chunks(self, n, quantity="states", t_start=None, t_end=None):
+        """
+        Yields (t, values) for n evenly spaced times over [t_start, t_end]
+        (default: the whole solve), chunk_size times at a time, without building
+        the whole time array; quantity is "states", "observables" or "cartesian".
+        """
+        evaluate = getattr(self, quantity)
+        t_start = self.t_start if t_start is None else t_start
+        t_end = self.t_end if t_end is None else t_end
+        step = (t_end - t_start) / max(n - 1, 1)
+        for start in range(0, n, self.chunk_size):
+            t = t_start + step * np.arange(start, min(start + self.chunk_size, n))
+            yield t, evaluate(t)
@@ -0,0 +1,356 @@
+import numpy as np
+from tqdm import tqdm
+import json
+import os
+
+from dynamics import (
+    DEFAULT_PARAMETERS,
+    PendulumParameters,
+    cache_parameters,
+    compute_observables,
+    integrate_trajectory,
+)
+from profiling import RunProfile
+
+
+def reduce_bins(values, index, factor):
+    """
+    One level up the pyramid: (7, 2, m) minima and maxima of the observables with
+    the sample indices where they occur, reduced over bins of factor consecutive
+    entries to (7, 2, ceil(m / factor)) (the last bin may be partial).
+    """
+    m = values.shape[2]
+    n_bins = -(-m // factor)
+    lo = np.full((7, n_bins * factor), np.inf)
+    hi = np.full((7, n_bins * factor), -np.inf)
+    lo[:, :m], hi[:, :m] = values[:, 0], values[:, 1]
+    i_lo = np.zeros((7, n_bins * factor), dtype=np.int64)
+    i_hi = np.zeros((7, n_bins * factor), dtype=np.int64)
+    i_lo[:, :m], i_hi[:, :m] = index[:, 0], index[:, 1]
+
+    lo, hi = lo.reshape(7, n_bins, factor), hi.reshape(7, n_bins, factor)
+    a_lo = np.argmin(lo, axis=2)[..., None]
+    a_hi = np.argmax(hi, axis=2)[..., None]
+    reduced_values = np.stack(
+        (
+            np.take_along_axis(lo, a_lo, axis=2)[..., 0],
+            np.take_along_axis(hi, a_hi, axis=2)[..., 0],
+        ),
+        axis=1,
+    )
+    reduced_index = np.stack(
+        (
+            np.take_along_axis(i_lo.reshape(7, n_bins, factor), a_lo, axis=2)[..., 0],
+            np.take_along_axis(i_hi.reshape(7, n_bins, factor), a_hi, axis=2)[..., 0],
+        ),
+        axis=1,
+    )
+    return reduced_values, reduced_index
+
+
+class TrajectoryStore:
+    """
+    On-disk store of one long trajectory sampled at n_samples evenly spaced times
+    over t_span, written chunk by chunk while it is integrated and read back
+    memory-mapped, so its length is bounded by the disk and not by the memory:
+      folder/samples.npy           (5, n_samples) t, q1, q2, omega1, omega2
+      folder/level_<k>_values.npy  (7, 2, n_k) minimum and maximum of each of the
+                                   7 observables over bins of factor**k samples
+      folder/level_<k>_index.npy   (7, 2, n_k) the samples where they occur
+      folder/checkpoint.json       number of samples written, the integrator state
+                                   after them, the number of pyramid levels and the
+                                   parameters of the run
+    The min/max levels (the pyramid) are built once the samples are complete; a
+    read of any time window at n points (decimated, envelope) then only touches
+    the coarsest level that still has n bins in the window, and the samples at
+    their extrema. The angles are decimated unwrapped.
+    """
+
+    factor = 16
+    # levels are built while they have at least min_bins bins
+    min_bins = 256
+    # bins reduced at a time while the pyramid is built, which bounds its memory
+    chunk_bins = 1 << 16
+
+    def __init__(self, folder, params, parameters=DEFAULT_PARAMETERS):
+        self.folder = folder
+        # through JSON, so that the parameters compare equal to the stored ones
+        self.params = json.loads(json.dumps(params))
+        self.parameters = parameters
+        self.t_start, self.t_end = self.params["t_span"]
+        self.n_samples = self.params["n_samples"]
+        os.makedirs(folder, exist_ok=True)
+
+        self.checkpoint = None
+        if os.path.exists(self.checkpoint_path):
+            with open(self.checkpoint_path) as f:
+                self.checkpoint = json.load(f)
+            if self.checkpoint["params"] != self.params:
+                raise ValueError(
+                    f"The trajectory stored in {folder} was computed with other parameters"
+                )
+            self.samples = np.load(self.samples_path, mmap_mode="r+")
+        else:
+            self.samples = np.lib.format.open_memmap(
+                self.samples_path, mode="w+", shape=(5, self.n_samples)
+            )
+
+    @classmethod
+    def open(cls, folder):
+        # the store written before in folder, with the parameters of its run
+        with open(os.path.join(folder, "checkpoint.json")) as f:
+            params = json.load(f)["params"]
+        parameters = PendulumParameters(
+            *(params[name] for name in ("g", "m1", "m2", "L1", "L2"))
+        )
+        return cls(folder, params, parameters)
+
+    @property
+    def checkpoint_path(self):
+        return os.path.join(self.folder, "checkpoint.json")
+
+    @property
+    def samples_path(self):
+        return os.path.join(self.folder, "samples.npy")
+
+    def level_path(self, k, kind):
+        return os.path.join(self.folder, f"level_{k}_{kind}.npy")
+
+    @property
+    def n_written(self):
+        return self.checkpoint["n_written"] if self.checkpoint else 0
+
+    @property
+    def n_levels(self):
+        # the number of levels of the pyramid, None before it is built
+        return self.checkpoint["n_levels"] if self.checkpoint else None
+
+    @property
+    def complete(self):
+        return self.n_levels is not None
+
+    def times(self, start, stop):
+        # the sample times of the samples [start, stop)
+        step = (self.t_end - self.t_start) / max(self.n_samples - 1, 1)
+        return self.t_start + step * np.arange(start, stop)
+
+    def write_checkpoint(self, **values):
+        checkpoint = {"n_written": 0, "n_levels": None, "params": self.params}
+        checkpoint.update(self.checkpoint or {})
+        checkpoint.update(values)
+        with open(self.checkpoint_path + ".tmp", "w") as f:
+            json.dump(checkpoint, f)
+        os.replace(self.checkpoint_path + ".tmp", self.checkpoint_path)
+        self.checkpoint = checkpoint
+
+    def append(self, t, y):
+        # writes the next samples (t, (4, n) states), then the checkpoint after them
+        start = self.n_written
+        self.samples[0, start : start + len(t)] = t
+        self.samples[1:, start : start + len(t)] = y
+        self.samples.flush()
+        self.write_checkpoint(
+            n_written=start + len(t), t=float(t[-1]), y=[float(v) for v in y[:, -1]]
+        )
+
+    def build_pyramid(self):
+        """
+        Builds the min/max levels from the complete samples, chunk_bins bins at a
+        time: level 1 from the observables of the samples, every next level from
+        the previous one.
+        """
+        n, k = self.n_samples, 0
+        while -(-n // self.factor) >= self.min_bins:
+            n_bins = -(-n // self.factor)
+            values = np.lib.format.open_memmap(
+                self.level_path(k + 1, "values"), mode="w+", shape=(7, 2, n_bins)
+            )
+            index = np.lib.format.open_memmap(
+                self.level_path(k + 1, "index"),
+                mode="w+",
+                dtype=np.int64,
+                shape=(7, 2, n_bins),
+            )
+            for first in range(0, n_bins, self.chunk_bins):
+                last = min(first + self.chunk_bins, n_bins)
+                values[:, :, first:last], index[:, :, first:last] = reduce_bins(
+                    *self.level(k, first * self.factor, last * self.factor),
+                    self.factor,
+                )
+            values.flush()
+            index.flush()
+            n, k = n_bins, k + 1
+        self.write_checkpoint(n_levels=k)
+
+    def level(self, k, first, last):
+        # the (7, 2, m) values and sample indices of the entries [first, last) of level k
+        if k == 0:
+            last = min(last, self.n_samples)
+            observables = np.array(
+                compute_observables(self.samples[1:, first:last], self.parameters)
+            )
+            index = np.broadcast_to(np.arange(first, last), (7, 2, last - first))
+            return np.stack((observables, observables), axis=1), index
+        return (
+            np.load(self.level_path(k, "values"), mmap_mode="r")[:, :, first:last],
+            np.load(self.level_path(k, "index"), mmap_mode="r")[:, :, first:last],
+        )
+
+    def window(self, t_start, t_end, n):
+        """
+        The samples [first, last) of the time window and the coarsest level k
+        with at least n bins in it (0: the samples themselves).
+        """
+        t_start = self.t_start if t_start is None else max(t_start, self.t_start)
+        t_end = self.t_end if t_end is None else min(t_end, self.t_end)
+        step = (self.t_end - self.t_start) / max(self.n_samples - 1, 1)
+        first = int(np.floor((t_start - self.t_start) / step + 1e-9))
+        last = min(
+            int(np.floor((t_end - self.t_start) / step + 1e-9)) + 1, self.n_samples
+        )
+        k = 0
+        while (
+            k < (self.n_levels or 0) and (last - first) // self.factor ** (k + 1) >= n
+        ):
+            k += 1
+        return first, last, k
+
+    def bins(self, t_start, t_end, n):
+        """
+        The window [t_start, t_end] (default: the whole run) reduced to about n bins,
+        from the coarsest level with at least n bins in it.
+        Returns (first, last, start, size, values, index): the samples [first, last)
+        of the window, the sample at which the first bin starts, the number of
+        samples per bin and the (7, 2, n_bins) values and sample indices of the bins.
+        """
+        first, last, k = self.window(t_start, t_end, n)
+        size = self.factor**k
+        start = first // size
+        values, index = self.level(k, start, -(-last // size))
+        group = max(values.shape[2] // n, 1)
+        if group > 1:
+            values, index = reduce_bins(values, index, group)
+        return first, last, start * size, size * group, values, index
+
+    def decimated(self, observables=(0, 4), t_start=None, t_end=None, n=2000):
+        """
+        The samples of the window [t_start, t_end] (default: the whole run) reduced
+        to about n bins: in every bin, the samples where each of the given
+        observables reaches its minimum and its maximum, in time order, so a plot
+        of them keeps the extent of the curve at every pixel (at most 4 samples per
+        bin for a phase plot of two observables).
+        Returns (t, the (7, m) observables of the samples), angles unwrapped.
+        """
+        first, last, _, size, _, index = self.bins(t_start, t_end, n)
+        if size == 1:
+            samples = np.asarray(self.samples[:, first:last])
+        else:
+            index = index[list(observables)].ravel()
+            index = np.unique(np.concatenate((index, [first, last - 1])))
+            samples = self.samples[:, index[(index >= first) & (index < last)]]
+        return samples[0], np.array(compute_observables(samples[1:], self.parameters))
+
+    def resampled(self, t_start=None, t_end=None, n=2000):
+        """
+        The samples of the window [t_start, t_end] (default: the whole run) taken
+        with an even stride, at least n (and fewer than 2 n) of them: evenly spaced
+        times for an animation, where decimated is for static plots (its samples
+        are where the extrema are, unevenly spaced in time).
+        Returns (t, the (7, m) observables of the samples).
+        """
+        first, last, _ = self.window(t_start, t_end, n)
+        stride = max((last - first) // n, 1)
+        samples = np.asarray(self.samples[:, first:last:stride])
+        return samples[0], np.array(compute_observables(samples[1:], self.parameters))
+
+    def envelope(self, i, t_start=None, t_end=None, n=2000):
+        """
+        The minimum and maximum of observable i over about n bins of the window
+        [t_start, t_end], for a time series plot (e.g. fill_between).
+        Returns (t at the start of every bin, lo, hi).
+        """
+        first, last, start, size, values, _ = self.bins(t_start, t_end, n)
+        t = self.times(start, last)[::size]
+        t[0] = self.times(first, first + 1)[0]
+        return t, values[i, 0], values[i, 1]
+
+    def extremes(self):
+        # the (7,) minima and maxima of the observables over the whole run
+        values, _ = self.level(self.n_levels or 0, 0, self.n_samples)
+        return values[:, 0].min(axis=1), values[:, 1].max(axis=1)
+
+
+def stream_trajectory(
+    folder,
+    y0,
+    t_span,
+    n_samples,
+    method="DOP853",
+    rtol=1e-10,
+    atol=1e-10,
+    dt=0.01,
+    chunk_size=1 << 16,
+    progress=True,
+    profile=None,
+    parameters=DEFAULT_PARAMETERS,
+):
+    """
+    Integrates the trajectory from y0 into the TrajectoryStore in folder, at
+    n_samples evenly spaced times over t_span, and returns the store.
+    The integration runs chunk_size samples at a time (integrate_trajectory over
+    each chunk, from the last state written), so only one chunk is ever in memory;
+    every chunk is followed by a checkpoint, and an interrupted run resumes from
+    the last one. The min/max pyramid is built once all the samples are written.
+    A store already complete for the same parameters is returned as it is.
+    method, rtol, atol, dt, profile and parameters: as in integrate_trajectory.
+    """
+    if profile is None:
+        profile = RunProfile()
+    params = cache_parameters(
+        parameters,
+        y0=[float(value) for value in y0],
+        t_span=[float(value) for value in t_span],
+        n_samples=int(n_samples),
+        method=method,
+        rtol=rtol,
+        atol=atol,
+        dt=dt,
+    )
+    store = TrajectoryStore(folder, params, parameters)
+    if store.complete:
+        return store
+    if store.n_written:
+        print(f"Resuming the trajectory from {store.n_written} samples")
+        t_0, y = store.checkpoint["t"], np.array(store.checkpoint["y"])
+    else:
+        t_0, y = float(t_span[0]), np.array(y0, dtype=float)
+
+    pbar = tqdm(total=n_samples, initial=store.n_written, disable=not progress)
+    while store.n_written < n_samples:
+        t_eval = store.times(
+            store.n_written, min(store.n_written + chunk_size, n_samples)
+        )
+        t, y_chunk = integrate_trajectory(
+            y,
+            (t_0, t_eval[-1]),
+            t_eval,
+            method,
+            rtol,
+            atol,
+            dt,
+            profile=profile,
+            parameters=parameters,
+        )
+        store.append(t, y_chunk)
+        t_0, y = t[-1], y_chunk[:, -1]
+        pbar.update(len(t))
+    pbar.close()
+
+    with profile.timer("pyramid"):
+        store.build_pyramid()
+    # the energy drift of the whole run, from its first and last samples and the
+    # extremes of the energy in the pyramid
+    lo, hi = store.extremes()
+    energy = [compute_observables(store.samples[1:, i], parameters)[6] for i in (0, -1)]
+    profile.record_energy([energy[0], lo[6], hi[6], energy[1]])
+    return store